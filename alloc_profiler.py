@@ -0,0 +1,149 @@
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_MIN_INTERVAL = 1.0
+DEFAULT_TOP = 10
+DEFAULT_FRAMES = 1
+# Allocations made by the profiler itself or the import machinery are not callback sites.
+_IGNORED = (
+   tracemalloc.Filter(False, tracemalloc.__file__),
+   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+   tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+   tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def current_rss():
+   try:
+      with open("/proc/self/statm") as f:
+         return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+   except (OSError, ValueError, IndexError):
+      return None
+
+
+# Per-callback allocation statistics from sampled calls, merged across samples.
+class CallbackStats:
+   def __init__(self):
+      self.calls = 0
+      self.samples = 0
+      self.peak_max = 0
+      self.peak_total = 0
+      self.retained_total = 0
+      self.sampled_seconds = 0.0
+      self.sites = Counter()
+
+   def as_dict(self, top):
+      return {
+         "calls": self.calls,
+         "samples": self.samples,
+         "peak_bytes_max": self.peak_max,
+         "peak_bytes_avg": self.peak_total // self.samples if self.samples else 0,
+         "retained_bytes_avg": self.retained_total // self.samples if self.samples else 0,
+         "sampled_ms_avg": round(self.sampled_seconds / self.samples * 1000, 2) if self.samples else 0.0,
+         "top_sites": [{"site": site, "bytes": size // self.samples} for site, size in self.sites.most_common(top)],
+      }
+
+
+# Sampled tracemalloc profiling that is cheap enough to leave on. Tracing is only switched on
+# for the duration of a sampled call and off again afterwards, so unsampled calls run at full
+# speed. At most one call is sampled at a time, picked with probability `sample_rate` and no
+# sooner than `min_interval` seconds after the previous sample ended.
+#
+# For each sample it records the peak traced memory during the call and the allocations still
+# alive when it returns, grouped by source line. The server is threaded, so a sample also sees
+# what other threads allocate meanwhile; averages over many samples smooth that out.
+class AllocationProfiler:
+   def __init__(self, sample_rate, min_interval=DEFAULT_MIN_INTERVAL, top=DEFAULT_TOP, frames=DEFAULT_FRAMES):
+      self.sample_rate = sample_rate
+      self.min_interval = min_interval
+      self.top = top
+      self.frames = frames
+      self.started_at = time.time()
+      self._callbacks = {}
+      self._sampling = threading.Lock()
+      self._lock = threading.Lock()
+      self._next_sample = 0.0
+      self._overhead = 0.0
+
+   # Returns a token for stop() when this call is sampled, else None.
+   def start(self, name):
+      with self._lock:
+         self._callbacks.setdefault(name, CallbackStats()).calls += 1
+      if time.monotonic() < self._next_sample or random.random() >= self.sample_rate:
+         return None
+      if not self._sampling.acquire(blocking=False):
+         return None
+      if tracemalloc.is_tracing():
+         # Someone else is tracing (e.g. PYTHONTRACEMALLOC); leave their traces alone.
+         self._sampling.release()
+         return None
+      tracemalloc.start(self.frames)
+      return (name, time.perf_counter())
+
+   def stop(self, token):
+      if token is None:
+         return
+      name, started = token
+      try:
+         stop_start = time.perf_counter()
+         _, peak = tracemalloc.get_traced_memory()
+         snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+         tracemalloc.stop()
+         statistics = snapshot.statistics("lineno")
+         with self._lock:
+            stats = self._callbacks[name]
+            stats.samples += 1
+            stats.sampled_seconds += stop_start - started
+            stats.peak_max = max(stats.peak_max, peak)
+            stats.peak_total += peak
+            stats.retained_total += sum(stat.size for stat in statistics)
+            for stat in statistics[:self.top * 2]:
+               frame = stat.traceback[0]
+               stats.sites[f"{frame.filename}:{frame.lineno}"] += stat.size
+            self._overhead += time.perf_counter() - stop_start
+      finally:
+         if tracemalloc.is_tracing():
+            tracemalloc.stop()
+         self._next_sample = time.monotonic() + self.min_interval
+         self._sampling.release()
+
+   def report(self):
+      with self._lock:
+         callbacks = {name: stats.as_dict(self.top) for name, stats in self._callbacks.items()}
+         overhead = self._overhead
+      return {
+         "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+         "pid": os.getpid(),
+         "uptime_seconds": round(time.time() - self.started_at, 1),
+         "rss_bytes": current_rss(),
+         "sample_rate": self.sample_rate,
+         "min_interval_seconds": self.min_interval,
+         "snapshot_overhead_seconds": round(overhead, 4),
+         "callbacks": dict(sorted(callbacks.items(), key=lambda item: -item[1]["peak_bytes_max"])),
+      }
+
+   def dump(self, path):
+      tmp_path = f"{path}.{os.getpid()}.tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+         json.dump(self.report(), f, indent=1)
+      os.replace(tmp_path, path)
+
+   # Rewrite the report at `path` every `interval` seconds from a daemon thread. "{pid}" in the
+   # path is replaced with the process ID, so each server worker writes its own file.
+   def start_dumping(self, path, interval):
+      path = path.replace("{pid}", str(os.getpid()))
+
+      def run():
+         while True:
+            time.sleep(interval)
+            try:
+               self.dump(path)
+            except OSError as e:
+               print(f"⚠️ Could not write the allocation report: {e}")
+
+      threading.Thread(target=run, name="alloc-profiler-dump", daemon=True).start()
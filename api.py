@@ -0,0 +1,282 @@
+import base64
+import hashlib
+import json
+
+import flask
+
+# Read-only catalog API for partner integrations. It reads straight from the catalog frames
+# and indexes and never touches the Dash layout or callback machinery.
+API_PREFIX = "/api/v1"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+EXPORT_CHUNK = 1000
+DATASETS = ("Country", "Region")
+
+
+class ApiError(Exception):
+   def __init__(self, status, message):
+      super().__init__(message)
+      self.status = status
+      self.message = message
+
+
+def _column(name):
+   return lambda df, dataset, positions: df[name].iloc[positions].tolist()
+
+
+def _stripped(name):
+   return lambda df, dataset, positions: [str(v).strip() for v in df[name].iloc[positions].tolist()]
+
+
+def _rounded(name, scale=1):
+   def values(df, dataset, positions):
+      return [None if v != v else round(v / scale, 4) for v in df[name].iloc[positions].tolist()]
+   return values
+
+
+# API field name -> column extractor taking (frame, dataset name, row positions).
+FIELDS = {
+   "id": _column("ID"),
+   "dataset": lambda df, dataset, positions: [dataset] * len(positions),
+   "region": _stripped("Region"),
+   "name": _column("Name"),
+   "price_eur": _rounded("price_cents", scale=100),
+   "price_cents": _column("price_cents"),
+   "data_gb": _column("Data (GB)"),
+   "validity_days": _column("Validity (Days)"),
+   "wifi_hotspot": _column("Wi-Fi Hotspot"),
+   "coverage": _stripped("Coverage"),
+   "traffic_policy": _column("Traffic Policy"),
+   "eur_per_gb": _rounded("eur_per_gb"),
+   "eur_per_day": _rounded("eur_per_day"),
+}
+
+
+# One dict per row, extracting each requested field column-wise for the whole batch.
+def build_records(built, dataset, positions, fields):
+   df = built.get(dataset)
+   columns = [FIELDS[field](df, dataset, positions) for field in fields]
+   return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+def _parse_fields(args):
+   if not args.get("fields"):
+      return list(FIELDS)
+   fields = [field.strip() for field in args["fields"].split(",") if field.strip()]
+   unknown = [field for field in fields if field not in FIELDS]
+   if unknown:
+      raise ApiError(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(FIELDS)}")
+   return fields
+
+
+def _parse_datasets(args):
+   dataset = args.get("dataset")
+   if not dataset:
+      return DATASETS
+   if dataset not in DATASETS:
+      raise ApiError(400, f"dataset must be one of {', '.join(DATASETS)}")
+   return (dataset,)
+
+
+def _parse_int(args, name, default=None, minimum=None, maximum=None):
+   value = args.get(name)
+   if value in (None, ""):
+      return default
+   try:
+      value = int(value)
+   except (TypeError, ValueError):
+      raise ApiError(400, f"{name} must be an integer")
+   if minimum is not None and value < minimum:
+      raise ApiError(400, f"{name} must be at least {minimum}")
+   return min(value, maximum) if maximum is not None else value
+
+
+# Data volumes are integers except for plans such as "Unlimited".
+def _parse_data(args):
+   value = args.get("data")
+   if value in (None, ""):
+      return None
+   return int(value) if value.isdigit() else value
+
+
+# Matching rows as (dataset, positions) segments, in the order they are paged through.
+def select_segments(built, args):
+   sort = args.get("sort") or None
+   if sort is not None and sort not in built.sort_keys:
+      raise ApiError(400, f"sort must be one of {', '.join(built.sort_keys)}")
+   data = _parse_data(args)
+   days = _parse_int(args, "days", minimum=1)
+
+   segments = []
+   for dataset in _parse_datasets(args):
+      region = None
+      if args.get("region"):
+         region = built.resolve_region(dataset, args["region"])
+         if region is None:
+            continue
+      positions = built.select_positions(dataset, region, data, days, sort)
+      if len(positions):
+         segments.append((dataset, positions))
+   return segments
+
+
+# Opaque cursor: the offset into the result plus the catalog version and query it belongs to.
+def _query_key(args):
+   query = sorted((k, v) for k, v in args.items(multi=True) if k not in ("cursor", "limit", "fields", "format"))
+   return hashlib.sha1(json.dumps(query).encode()).hexdigest()[:8]
+
+
+def encode_cursor(built, args, offset):
+   payload = json.dumps({"v": built.version, "q": _query_key(args), "o": offset}, separators=(",", ":"))
+   return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(built, args):
+   cursor = args.get("cursor")
+   if not cursor:
+      return 0
+   try:
+      payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+      offset = int(payload["o"])
+   except (ValueError, KeyError, TypeError):
+      raise ApiError(400, "Invalid cursor")
+   if offset < 0:
+      raise ApiError(400, "Invalid cursor")
+   if payload.get("q") != _query_key(args):
+      raise ApiError(400, "Cursor does not belong to this query")
+   if payload.get("v") != built.version:
+      raise ApiError(410, "The catalog has changed since this cursor was issued; restart without a cursor")
+   return offset
+
+
+# Yield (dataset, positions) slices covering rows [offset, offset + limit) across the segments.
+def slice_segments(segments, offset, limit=None, chunk=None):
+   remaining = limit
+   for dataset, positions in segments:
+      if offset >= len(positions):
+         offset -= len(positions)
+         continue
+      end = len(positions) if remaining is None else min(len(positions), offset + remaining)
+      step = chunk or (end - offset)
+      for start in range(offset, end, step):
+         yield dataset, positions[start:min(end, start + step)]
+      if remaining is not None:
+         remaining -= end - offset
+         if remaining <= 0:
+            return
+      offset = 0
+
+
+def create_api(get_catalog, change_feed=None):
+   api = flask.Blueprint("catalog_api", __name__, url_prefix=API_PREFIX)
+
+   def require_catalog():
+      built = get_catalog()
+      if built is None:
+         raise ApiError(503, "The catalog is still loading")
+      return built
+
+   @api.errorhandler(ApiError)
+   def handle_api_error(e):
+      return {"error": e.message}, e.status
+
+   @api.route("/regions")
+   def list_regions():
+      built = require_catalog()
+      regions = []
+      for dataset in _parse_datasets(flask.request.args):
+         counts = built.get(dataset)['Region'].value_counts(sort=False)
+         regions.extend({"dataset": dataset, "name": str(region).strip(), "plans": int(count)}
+                        for region, count in counts.items() if count)
+      return {"catalog_version": built.version, "regions": regions}
+
+   @api.route("/plans")
+   def list_plans():
+      built = require_catalog()
+      args = flask.request.args
+      fields = _parse_fields(args)
+      segments = select_segments(built, args)
+      offset = decode_cursor(built, args)
+      total = sum(len(positions) for _, positions in segments)
+
+      # Bulk export: stream every remaining row (or `limit` rows) as newline-delimited JSON.
+      if args.get("format") == "ndjson":
+         limit = _parse_int(args, "limit", minimum=1)
+
+         def generate():
+            for dataset, positions in slice_segments(segments, offset, limit, chunk=EXPORT_CHUNK):
+               yield "".join(json.dumps(record) + "\n" for record in build_records(built, dataset, positions, fields))
+
+         return flask.Response(generate(), mimetype="application/x-ndjson",
+                               headers={"X-Catalog-Version": built.version, "X-Total-Count": str(total)})
+
+      limit = _parse_int(args, "limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+      items = []
+      for dataset, positions in slice_segments(segments, offset, limit):
+         items.extend(build_records(built, dataset, positions, fields))
+      next_offset = offset + len(items)
+      return {
+         "catalog_version": built.version,
+         "total": total,
+         "items": items,
+         "next_cursor": encode_cursor(built, args, next_offset) if next_offset < total else None,
+      }
+
+   # Incremental change feed: pass the catalog_version you last saw as ?since= and apply the
+   # returned change sets in order. 410 means that version has left the history.
+   @api.route("/changes")
+   def list_changes():
+      built = require_catalog()
+      since = flask.request.args.get("since")
+      if not since or since == built.version:
+         return {"catalog_version": built.version, "change_sets": []}
+      change_sets = change_feed.since(since, built.version) if change_feed is not None else None
+      if change_sets is None:
+         raise ApiError(410, f"Version {since} is no longer in the change history; reload the full catalog")
+      return {"catalog_version": built.version, "change_sets": change_sets}
+
+   # Itinerary quote: POST {"legs": [{"destination", "data", "days"}, ...], "alternatives"?}, where
+   # a leg may also be a [destination, data, days] list and data/days are minimums. Returns the
+   # cheapest ways to cover the legs, letting one Region plan serve several of them, next to the
+   # total of buying a plan per leg.
+   @api.route("/quotes", methods=["POST"])
+   def quote_itinerary():
+      built = require_catalog()
+      # Deferred import: quotes needs numpy and pandas, which only the catalog loader imports first.
+      import quotes
+      payload = flask.request.get_json(silent=True)
+      if not isinstance(payload, dict):
+         raise ApiError(400, "Body must be a JSON object")
+      fields = _parse_fields(flask.request.args)
+      alternatives = _parse_int(payload, "alternatives", quotes.DEFAULT_ALTERNATIVES, minimum=1,
+                                 maximum=quotes.MAX_ALTERNATIVES)
+      try:
+         legs, combinations, separate, unmatched = quotes.quote(built, payload.get("legs"), alternatives)
+      except quotes.QuoteError as e:
+         raise ApiError(400, str(e))
+
+      results = []
+      for total, plans in combinations:
+         items = []
+         for dataset, position, covered in plans:
+            record = build_records(built, dataset, [position], fields)[0]
+            items.append({"legs": covered, **record})
+         results.append({"total_eur": total / 100, "total_cents": total, "plans": items})
+      return {
+         "catalog_version": built.version,
+         "legs": [{"destination": country, "data_gb": quotes.data_label(data), "days": days} for _, country, data, days in legs],
+         "combinations": results,
+         "separate_total_cents": separate,
+         "unmatched_legs": unmatched,
+      }
+
+   @api.route("/plans/<plan_id>")
+   def get_plan(plan_id):
+      built = require_catalog()
+      found = built.find_plan(plan_id)
+      if found is None:
+         raise ApiError(404, f"No plan with ID {plan_id}")
+      dataset, position = found
+      return build_records(built, dataset, [position], _parse_fields(flask.request.args))[0]
+
+   return api
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from orders import OrderQueueFull
+
+# ASGI deployment mode: `pip install uvicorn`, then `uvicorn asgi:app --workers 2`.
+#
+# POST /orders is served natively on the event loop, and the order pipeline runs on that same
+# loop, so a handful of workers can hold thousands of in-flight submits. Everything else (the
+# Dash app, the catalog API, the probes) is the unchanged Flask server, run on a thread pool
+# through the WSGI bridge below.
+WSGI_THREADS = int(os.environ.get("TRAVELESIM_WSGI_THREADS", "32"))
+# Largest request body passed on to the Flask server; Dash callback payloads are far smaller.
+MAX_WSGI_BODY = int(os.environ.get("TRAVELESIM_MAX_BODY", str(10 * 1024 * 1024)))
+ORDER_PATH = "/orders"
+MAX_ORDER_BODY = 64 * 1024
+ORDER_FIELDS = ("name", "email", "phone", "plan_id")
+
+
+async def _read_body(receive, limit=None):
+   body = bytearray()
+   while True:
+      message = await receive()
+      body += message.get("body", b"")
+      if limit is not None and len(body) > limit:
+         return None
+      if not message.get("more_body"):
+         return bytes(body)
+
+
+async def _send_json(send, status, payload, headers=()):
+   body = json.dumps(payload).encode()
+   await send({
+      "type": "http.response.start",
+      "status": status,
+      "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+   })
+   await send({"type": "http.response.body", "body": body})
+
+
+def _environ(scope, body):
+   server = scope.get("server") or ("localhost", 80)
+   client = scope.get("client") or ("", 0)
+   environ = {
+      "REQUEST_METHOD": scope["method"],
+      "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+      "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+      "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+      "SERVER_NAME": server[0],
+      "SERVER_PORT": str(server[1]),
+      "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+      "REMOTE_ADDR": client[0],
+      "wsgi.version": (1, 0),
+      "wsgi.url_scheme": scope.get("scheme", "http"),
+      "wsgi.input": io.BytesIO(body),
+      "wsgi.errors": sys.stderr,
+      "wsgi.multithread": True,
+      "wsgi.multiprocess": True,
+      "wsgi.run_once": False,
+   }
+   for name, value in scope.get("headers", []):
+      name, value = name.decode("latin-1"), value.decode("latin-1")
+      if name == "content-type":
+         environ["CONTENT_TYPE"] = value
+      elif name == "content-length":
+         environ["CONTENT_LENGTH"] = value
+      else:
+         key = "HTTP_" + name.upper().replace("-", "_")
+         environ[key] = f"{environ[key]},{value}" if key in environ else value
+   return environ
+
+
+# Runs a WSGI app on a thread pool and streams its response chunk by chunk, so NDJSON exports
+# are not buffered. asgiref's WsgiToAsgi would serialize every request onto a single thread.
+class WsgiBridge:
+   def __init__(self, wsgi_app, threads=WSGI_THREADS, max_body=MAX_WSGI_BODY):
+      self.wsgi_app = wsgi_app
+      self.max_body = max_body
+      self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+   async def __call__(self, scope, receive, send):
+      body = await _read_body(receive, self.max_body)
+      if body is None:
+         return await _send_json(send, 413, {"error": "Request body is too large"})
+      environ = _environ(scope, body)
+      loop = asyncio.get_running_loop()
+      response = {}
+
+      def start_response(status, headers, exc_info=None):
+         response["status"] = int(status.split(" ", 1)[0])
+         response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+         return lambda data: None
+
+      result = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+      try:
+         chunks = iter(result)
+         chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+         await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+         while chunk is not None:
+            if chunk:
+               await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+         await send({"type": "http.response.body", "body": b""})
+      finally:
+         if hasattr(result, "close"):
+            await loop.run_in_executor(self.executor, result.close)
+
+
+def _client_ip(scope):
+   if main.TRUST_PROXY:
+      for name, value in scope.get("headers", []):
+         if name == b"x-forwarded-for":
+            return value.decode("latin-1").split(",")[0].strip()
+   return (scope.get("client") or ("", 0))[0]
+
+
+# JSON order submission: {"name", "email", "phone", "plan_id", "idempotency_key"?}. Answers 202
+# once the order is queued; the audit log and other I/O complete on the loop afterwards.
+async def submit_order(scope, receive, send, executor):
+   if scope["method"] != "POST":
+      return await _send_json(send, 405, {"error": "Use POST"}, [(b"allow", b"POST")])
+   if not main.allow_request(_client_ip(scope)):
+      return await _send_json(send, 429, {"error": "Too many requests, please slow down."}, [(b"retry-after", b"1")])
+   body = await _read_body(receive, MAX_ORDER_BODY)
+   if body is None:
+      return await _send_json(send, 413, {"error": "Order body is too large"})
+   try:
+      payload = json.loads(body)
+   except ValueError:
+      payload = None
+   if not isinstance(payload, dict):
+      return await _send_json(send, 400, {"error": "Body must be a JSON object"})
+   missing = [field for field in ORDER_FIELDS if not payload.get(field)]
+   if missing:
+      return await _send_json(send, 400, {"error": f"Missing fields: {', '.join(missing)}"})
+
+   built = main.current_catalog()
+   if built is None:
+      return await _send_json(send, 503, {"error": "The catalog is still loading"}, [(b"retry-after", b"5")])
+   loop = asyncio.get_running_loop()
+   # Plan lookup is pandas work (and builds the ID index and price labels on first use), so it
+   # runs off the loop like the key claim.
+   selection = await loop.run_in_executor(executor, main.plan_selection, built, str(payload["plan_id"]))
+   if selection is None:
+      return await _send_json(send, 404, {"error": f"No plan with ID {payload['plan_id']}"})
+
+   key = payload.get("idempotency_key")
+   # The shared key store may be SQLite, so claim the key off the loop.
+   claimed = await loop.run_in_executor(executor, main.claim_order, key)
+   if not claimed:
+      return await _send_json(send, 200, {"status": "duplicate", "idempotency_key": key})
+
+   order = main.build_order(payload["name"], payload["email"], payload["phone"], selection, key, "api")
+   try:
+      await main.ORDER_PIPELINE.submit(order)
+   except OrderQueueFull as e:
+      await loop.run_in_executor(executor, main.release_order, key)
+      return await _send_json(send, 503, {"error": f"Order queue is full: {e}"}, [(b"retry-after", b"1")])
+   await _send_json(send, 202, {"status": "queued", "order_id": order["order_id"]})
+
+
+async def _lifespan(receive, send):
+   while True:
+      message = await receive()
+      if message["type"] == "lifespan.startup":
+         await main.ORDER_PIPELINE.start()
+         await send({"type": "lifespan.startup.complete"})
+      elif message["type"] == "lifespan.shutdown":
+         await main.ORDER_PIPELINE.stop()
+         await send({"type": "lifespan.shutdown.complete"})
+         return
+
+
+_wsgi = WsgiBridge(main.server)
+
+
+async def app(scope, receive, send):
+   if scope["type"] == "lifespan":
+      return await _lifespan(receive, send)
+   if scope["type"] != "http":
+      return
+   # Servers started without lifespan support get the pipeline on the first request instead.
+   await main.ORDER_PIPELINE.start()
+   if scope["path"] == ORDER_PATH:
+      return await submit_order(scope, receive, send, _wsgi.executor)
+   await _wsgi(scope, receive, send)
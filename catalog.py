@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+import validation
+
+# Source workbooks keyed by dataset name (the sheet name matches the dataset).
+SOURCES = {
+   "Country": "Country.xlsx",
+   "Region": "Region.xlsx",
+}
+SNAPSHOT_NAME = "catalog_snapshot.pkl"
+# Bump whenever the columns derived at load time change, so old snapshots are rebuilt.
+SNAPSHOT_FORMAT = 4
+
+# Columns added by add_price_columns; everything else comes from the workbooks.
+DERIVED_COLUMNS = ("price_cents", "allowance_gb", "eur_per_gb", "eur_per_day")
+
+# "Limit - Maximum Data 10GB" caps a plan's total data; "Daily - 2GB per Day, then 1Mbps" only
+# throttles, so the total is unlimited.
+_POLICY_LIMIT = r"^\s*Limit\D*(\d+(?:\.\d+)?)\s*GB"
+_POLICY_DAILY = r"^\s*Daily\b"
+
+# Sort keys offered in the UI, mapped to the derived column they order by (ascending, NaN last).
+SORT_COLUMNS = {
+   "price": "price_cents",
+   "per_gb": "eur_per_gb",
+   "per_day": "eur_per_day",
+}
+
+
+class Catalog:
+   sort_keys = tuple(SORT_COLUMNS)
+
+   def __init__(self, frames, signature):
+      self.frames = frames
+      self.signature = signature
+      # Identifies this build of the catalog, e.g. in API pagination cursors.
+      self.version = hashlib.sha1(json.dumps([SNAPSHOT_FORMAT, signature], sort_keys=True).encode()).hexdigest()[:12]
+      # Per-worker caches derived from the frames; filling them twice under a race is harmless.
+      self._orders = {}
+      self._labels = {}
+      self._regions = {}
+      self._ids = None
+
+   def get(self, dataset):
+      return self.frames.get(dataset)
+
+   # Map a region name to its catalog value, ignoring case and surrounding whitespace.
+   def resolve_region(self, dataset, name):
+      lookup = self._regions.get(dataset)
+      if lookup is None:
+         lookup = self._regions[dataset] = {
+            str(region).strip().casefold(): region for region in self.frames[dataset]['Region'].unique()
+         }
+      return lookup.get(str(name).strip().casefold())
+
+   # (dataset, row position) of a plan ID, or None.
+   def find_plan(self, plan_id):
+      if self._ids is None:
+         ids = {}
+         for dataset, df in self.frames.items():
+            ids.update((plan, (dataset, pos)) for pos, plan in enumerate(df['ID'].tolist()))
+         self._ids = ids
+      return self._ids.get(plan_id)
+
+   # Row positions in ascending order of a sort key, computed once per dataset and key.
+   def sort_order(self, dataset, sort):
+      key = (dataset, sort)
+      order = self._orders.get(key)
+      if order is None:
+         values = self.frames[dataset][SORT_COLUMNS[sort]].to_numpy(dtype=float)
+         order = self._orders[key] = np.argsort(values, kind="stable")
+      return order
+
+   # Positions of the rows matching the filters. Sorted results are read off the presorted
+   # permutation with a boolean gather, so no request ever sorts.
+   def select_positions(self, dataset, region=None, data=None, days=None, sort=None):
+      df = self.frames[dataset]
+      mask = np.ones(len(df), dtype=bool)
+      if region:
+         mask &= (df['Region'] == region).to_numpy()
+      if data:
+         mask &= (df['Data (GB)'] == data).to_numpy()
+      if days:
+         mask &= (df['Validity (Days)'] == days).to_numpy()
+      if sort in SORT_COLUMNS:
+         order = self.sort_order(dataset, sort)
+         return order[mask[order]]
+      return np.flatnonzero(mask)
+
+   # Display strings for a derived price column in one currency. The whole dataset is
+   # converted and formatted in a single vectorized pass per (currency, rate version); a new
+   # rate version replaces the cached labels of the previous one.
+   def price_labels(self, dataset, column, currency="EUR", symbol="€", rate=1.0, rate_version=None):
+      key = (dataset, column, currency)
+      cached = self._labels.get(key)
+      if cached is not None and cached[0] == rate_version:
+         return cached[1]
+      values = self.frames[dataset][column].to_numpy(dtype=float)
+      if column == "price_cents":
+         values = values / 100
+      converted = np.round(values * rate, 2)
+      labels = np.char.add(symbol, np.char.mod("%.2f", converted)).astype(object)
+      labels[np.isnan(converted)] = "–"
+      self._labels[key] = (rate_version, labels)
+      return labels
+
+
+# Total data in GB a plan allows, inf when unlimited. The traffic policy is what the network
+# enforces (the Region workbook's Data column does not line up with its plan names), so it wins
+# over the Data column, which is only used for rows without a policy.
+def data_allowance(df):
+   data = pd.to_numeric(df['Data (GB)'], errors="coerce").to_numpy(dtype=float)
+   data[(df['Data (GB)'].astype(str) == validation.UNLIMITED).to_numpy()] = np.inf
+   policy = df['Traffic Policy'].astype(str)
+   limit = pd.to_numeric(policy.str.extract(_POLICY_LIMIT, expand=False), errors="coerce").to_numpy(dtype=float)
+   data = np.where(np.isnan(limit), data, limit)
+   data[policy.str.contains(_POLICY_DAILY, regex=True).to_numpy()] = np.inf
+   return data
+
+
+# Numeric price in cents, the data allowance, and comparable unit costs; unlimited data has
+# no €/GB. Expects validated rows, so every price parses.
+def add_price_columns(df):
+   price = validation.parse_prices(df['RRP info'])
+   df = df.copy()
+   data_gb = pd.Series(data_allowance(df), index=df.index)
+   days = pd.to_numeric(df['Validity (Days)'], errors="coerce")
+   df['price_cents'] = (price * 100).round().astype("int64")
+   df['allowance_gb'] = data_gb
+   df['eur_per_gb'] = (price / data_gb.where((data_gb > 0) & (data_gb < np.inf))).astype(float)
+   df['eur_per_day'] = (price / days.where(days > 0)).astype(float)
+   return df
+
+
+# Size and mtime of every source workbook, used to tell whether a snapshot is stale.
+def source_signature(base_dir):
+   signature = {}
+   for dataset, file_name in SOURCES.items():
+      stat = os.stat(os.path.join(base_dir, file_name))
+      signature[dataset] = [stat.st_size, stat.st_mtime_ns]
+   return signature
+
+
+def snapshot_path(base_dir):
+   return os.environ.get("TRAVELESIM_SNAPSHOT") or os.path.join(base_dir, SNAPSHOT_NAME)
+
+
+# Clean data: strip spaces from the headers, then keep the rows that pass validation.
+def clean_frame(df, dataset):
+   df.columns = df.columns.str.strip()
+   return validation.validate_frame(df, dataset)
+
+
+def read_workbooks(base_dir):
+   frames = {}
+   for dataset, file_name in SOURCES.items():
+      frames[dataset] = pd.read_excel(os.path.join(base_dir, file_name), sheet_name=dataset)
+   return frames
+
+
+# Load a pickled catalog if it was built from the current workbooks, otherwise None.
+def load_snapshot(path, signature):
+   try:
+      with open(path, "rb") as f:
+         payload = pickle.load(f)
+   except FileNotFoundError:
+      return None
+   except Exception as e:
+      print(f"⚠️ Ignoring unreadable catalog snapshot {path}: {e}")
+      return None
+   if payload.get("format") != SNAPSHOT_FORMAT or payload.get("signature") != signature:
+      return None
+   return payload["frames"]
+
+
+def write_snapshot(path, catalog):
+   payload = {"format": SNAPSHOT_FORMAT, "signature": catalog.signature, "frames": catalog.frames}
+   tmp_path = f"{path}.{os.getpid()}.tmp"
+   with open(tmp_path, "wb") as f:
+      pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+   os.replace(tmp_path, path)
+
+
+def _plain(value):
+   if hasattr(value, "item"):
+      value = value.item()
+   return None if isinstance(value, float) and value != value else value
+
+
+def _source_columns(df):
+   return [col for col in df.columns if col not in DERIVED_COLUMNS]
+
+
+# One row per plan ID with the dataset, row position and a hash of the workbook columns.
+def _keyed_rows(built):
+   parts = []
+   for dataset, df in built.frames.items():
+      hashes = pd.util.hash_pandas_object(df[_source_columns(df)], index=False).to_numpy()
+      parts.append(pd.DataFrame(
+         {"dataset": dataset, "position": np.arange(len(df)), "hash": hashes},
+         index=pd.Index(df['ID'].astype(object).to_numpy(), name="ID"),
+      ))
+   rows = pd.concat(parts)
+   return rows[~rows.index.duplicated()]
+
+
+def _row_values(built, dataset, position):
+   df = built.frames[dataset]
+   return {col: _plain(value) for col, value in df[_source_columns(df)].iloc[position].items()}
+
+
+# Compare two catalog versions keyed by plan ID. Rows are matched through hash joins on the
+# ID and compared by row hash, so the cost is linear in the catalog size; only the rows that
+# differ are materialized into added/removed/changed records.
+def diff_catalogs(old, new):
+   old_rows, new_rows = _keyed_rows(old), _keyed_rows(new)
+   added = new_rows.index.difference(old_rows.index, sort=False)
+   removed = old_rows.index.difference(new_rows.index, sort=False)
+   common = new_rows.index.intersection(old_rows.index, sort=False)
+   before, after = old_rows.loc[common], new_rows.loc[common]
+   differs = (before['hash'].to_numpy() != after['hash'].to_numpy()) | \
+             (before['dataset'].to_numpy() != after['dataset'].to_numpy())
+
+   records = []
+   for plan_id, row in new_rows.loc[added].iterrows():
+      records.append({"type": "added", "id": plan_id, "dataset": row['dataset'],
+                      "plan": _row_values(new, row['dataset'], row['position'])})
+   for plan_id, row in old_rows.loc[removed].iterrows():
+      records.append({"type": "removed", "id": plan_id, "dataset": row['dataset']})
+   for plan_id in common[differs]:
+      was, now = before.loc[plan_id], after.loc[plan_id]
+      old_values = _row_values(old, was['dataset'], was['position'])
+      new_values = _row_values(new, now['dataset'], now['position'])
+      fields = {col: {"old": old_values.get(col), "new": value}
+                for col, value in new_values.items() if old_values.get(col) != value}
+      if was['dataset'] != now['dataset']:
+         fields["dataset"] = {"old": was['dataset'], "new": now['dataset']}
+      records.append({"type": "changed", "id": plan_id, "dataset": now['dataset'], "fields": fields})
+   return records
+
+
+# Build the catalog, preferring a prebuilt snapshot so openpyxl is never imported.
+# Phase durations (seconds) are recorded into `timings` when given.
+def load_catalog(base_dir, timings=None, use_snapshot=True):
+   timings = timings if timings is not None else {}
+   signature = source_signature(base_dir)
+   path = snapshot_path(base_dir)
+
+   if use_snapshot:
+      start = time.perf_counter()
+      frames = load_snapshot(path, signature)
+      timings["snapshot_load"] = time.perf_counter() - start
+      if frames is not None:
+         return Catalog(frames, signature)
+
+   start = time.perf_counter()
+   frames = read_workbooks(base_dir)
+   timings["read_excel"] = time.perf_counter() - start
+
+   start = time.perf_counter()
+   rejections = []
+   counts = {}
+   for dataset, df in frames.items():
+      frames[dataset], rejected = clean_frame(df, dataset)
+      rejections.extend(rejected)
+      counts[dataset] = {"rows": len(df), "accepted": len(frames[dataset]), "rejected": len(df) - len(frames[dataset])}
+   timings["validate"] = time.perf_counter() - start
+   if rejections:
+      rejected = ", ".join(f"{dataset}: {count['rejected']}" for dataset, count in counts.items())
+      print(f"⚠️ Rejected catalog rows ({rejected}), see {validation.report_path(base_dir)}")
+   try:
+      validation.write_report(validation.report_path(base_dir), signature, counts, rejections)
+   except OSError as e:
+      print(f"⚠️ Could not write the rejection report: {e}")
+
+   start = time.perf_counter()
+   frames = {dataset: add_price_columns(df) for dataset, df in frames.items()}
+   timings["derive"] = time.perf_counter() - start
+   catalog = Catalog(frames, signature)
+
+   if use_snapshot:
+      start = time.perf_counter()
+      try:
+         write_snapshot(path, catalog)
+      except OSError as e:
+         print(f"⚠️ Could not write catalog snapshot {path}: {e}")
+      timings["snapshot_write"] = time.perf_counter() - start
+   return catalog
+
+
+# Prebuild the snapshot, e.g. as a container build step: `python catalog.py`
+if __name__ == "__main__":
+   base = os.path.dirname(os.path.abspath(__file__))
+   phases = {}
+   built = load_catalog(base, phases, use_snapshot=False)
+   write_snapshot(snapshot_path(base), built)
+   print(f"✅ Wrote {snapshot_path(base)} "
+         f"({', '.join(f'{name}: {len(df)} rows' for name, df in built.frames.items())}) "
+         f"in {sum(phases.values()):.2f}s")
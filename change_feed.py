@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_HISTORY = 50
+
+
+# Bounded history of catalog change sets. Each set links the catalog version it was computed
+# from to the version it produced, so a client polls with the last version it has seen and
+# receives every later set in order. Versions older than the retained history return None,
+# telling the client to reload the full catalog.
+#
+# With a directory, each set is also written there as changes-<from version>.json, so worker
+# processes share one history: a worker started after a reload answers for versions it never
+# loaded itself, and the history survives restarts.
+class ChangeFeed:
+   def __init__(self, max_history=DEFAULT_HISTORY, directory=None):
+      self.max_history = max_history
+      self.directory = directory
+      self._sets = deque(maxlen=max_history)
+      self._lock = threading.Lock()
+
+   def append(self, from_version, to_version, records):
+      change_set = {
+         "from_version": from_version,
+         "to_version": to_version,
+         "created_at": time.time(),
+         "summary": dict(Counter(record["type"] for record in records)),
+         "changes": records,
+      }
+      with self._lock:
+         self._sets.append(change_set)
+      if self.directory:
+         try:
+            self._write(change_set)
+         except OSError as e:
+            print(f"⚠️ Could not write change set {from_version} -> {to_version}: {e}")
+      return change_set
+
+   def _path(self, from_version):
+      return os.path.join(self.directory, f"changes-{from_version}.json")
+
+   # Every worker that reloads writes the same set, so the last atomic replace wins harmlessly.
+   def _write(self, change_set):
+      os.makedirs(self.directory, exist_ok=True)
+      path = self._path(change_set["from_version"])
+      tmp_path = f"{path}.{os.getpid()}.tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+         json.dump(change_set, f, default=str)
+      os.replace(tmp_path, path)
+      names = [name for name in os.listdir(self.directory) if name.startswith("changes-") and name.endswith(".json")]
+      if len(names) > self.max_history:
+         paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+         for stale in paths[:len(paths) - self.max_history]:
+            try:
+               os.remove(stale)
+            except OSError:
+               pass
+
+   # The latest set computed from `version`: this process's own first, then the shared ones.
+   def _load(self, version):
+      with self._lock:
+         for change_set in reversed(self._sets):
+            if change_set["from_version"] == version:
+               return change_set
+      if not self.directory:
+         return None
+      try:
+         with open(self._path(version), encoding="utf-8") as f:
+            return json.load(f)
+      except (OSError, ValueError):
+         return None
+
+   # The sets leading from `version` to `until` (the caller's current catalog version), in
+   # order; None when part of that chain is no longer retained.
+   def since(self, version, until):
+      sets = []
+      while version != until:
+         change_set = self._load(version)
+         if change_set is None or len(sets) >= self.max_history:
+            return None
+         sets.append(change_set)
+         version = change_set["to_version"]
+      return sets
@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+import time
+
+BASE_CURRENCY = "EUR"
+SYMBOLS = {"EUR": "€", "GBP": "£", "USD": "$"}
+DEFAULT_REFRESH_INTERVAL = 60
+
+
+def currency_symbol(currency):
+   return SYMBOLS.get(currency, f"{currency} ")
+
+
+# Immutable set of rates (units of currency per 1 EUR). `version` changes whenever the
+# rates file does, and is part of every cache key built from these rates.
+class FxTable:
+   def __init__(self, rates, version):
+      self.rates = rates
+      self.version = version
+
+   def rate(self, currency):
+      return self.rates.get(currency)
+
+
+def read_fx_table(path):
+   with open(path, encoding="utf-8") as f:
+      payload = json.load(f)
+   if payload.get("base", BASE_CURRENCY) != BASE_CURRENCY:
+      raise ValueError(f"FX rates in {path} must be quoted against {BASE_CURRENCY}")
+   rates = {code.upper(): float(rate) for code, rate in payload.get("rates", {}).items() if float(rate) > 0}
+   rates[BASE_CURRENCY] = 1.0
+   stat = os.stat(path)
+   return FxTable(rates, f"{stat.st_mtime_ns}-{stat.st_size}")
+
+
+# Rates loaded from a JSON file ({"base": "EUR", "rates": {"GBP": 0.85, ...}}). The file is
+# re-checked at most every refresh_interval seconds and a changed table replaces the old one
+# in a single reference swap, so readers always see one consistent table.
+class FxRates:
+   def __init__(self, path, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+      self.path = path
+      self.refresh_interval = refresh_interval
+      self._table = FxTable({BASE_CURRENCY: 1.0}, "base")
+      self._checked = 0.0
+      self._lock = threading.Lock()
+      self.refresh()
+
+   def refresh(self):
+      with self._lock:
+         self._checked = time.monotonic()
+         try:
+            stat = os.stat(self.path)
+         except FileNotFoundError:
+            return self._table
+         if self._table.version != f"{stat.st_mtime_ns}-{stat.st_size}":
+            try:
+               self._table = read_fx_table(self.path)
+               print(f"💱 Loaded FX rates {self._table.version}: {', '.join(sorted(self._table.rates))}")
+            except (OSError, ValueError) as e:
+               print(f"⚠️ Keeping previous FX rates, could not read {self.path}: {e}")
+         return self._table
+
+   def current(self):
+      if time.monotonic() - self._checked >= self.refresh_interval:
+         return self.refresh()
+      return self._table
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from html import escape
+
+from currency import currency_symbol
+
+DATASETS = ("Country", "Region")
+DEFAULT_MAX_AGE = 300
+# State only the Dash layout uses (the pre-rendered component tree); left out of the published
+# HTML and JSON.
+LAYOUT_ONLY = ("table",)
+
+
+def slugify(region):
+   return "-".join(str(region).split()).lower()
+
+
+def _json_default(value):
+   if hasattr(value, "item"):
+      return value.item()
+   raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _price(symbol, value):
+   return "–" if value is None else f"{symbol}{value:.2f}"
+
+
+# A standalone document: the destination's plans as a plain table, a link into the interactive
+# app starting at this destination, and the precomputed state as embedded JSON.
+def render_html(state):
+   symbol = currency_symbol(state["currency"])
+   region = escape(state["region"])
+   rows = "\n".join(
+      "<tr>" + "".join(f"<td>{escape(str(cell))}</td>" for cell in (
+         plan["name"], plan["data_gb"], plan["validity_days"], _price(symbol, plan["price_eur"]),
+         _price(symbol, plan["eur_per_gb"]), _price(symbol, plan["eur_per_day"]), plan["traffic_policy"],
+      )) + "</tr>"
+      for plan in state["plans"]
+   )
+   cheapest = _price(symbol, state["plans"][0]["price_eur"]) if state["plans"] else "–"
+   # Embedded JSON must not be able to close the script element.
+   embedded = json.dumps(state, default=_json_default).replace("</", "<\\/")
+   return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Travel eSIM for {region}</title>
+<link rel="stylesheet" href="/assets/styles.css">
+</head>
+<body style="font-family: Arial, sans-serif; padding: 20px; background: linear-gradient(120deg, #e6e6fa 0%, #f3f3fd 100%); min-height: 100vh">
+<div style="text-align: center">
+<h1 style="color: #3c3c3c; font-size: 36px; margin-bottom: 0">Travel eSIM for {region}</h1>
+<p style="color: #666; font-size: 14px; margin-top: 5px">{len(state["plans"])} plans from {cheapest}</p>
+<p><a id="order-button" href="{escape(state["app_url"])}" style="display: inline-block; padding: 12px 24px; background-color: #6A4AE2; color: white; border-radius: 8px; text-decoration: none">Choose your plan</a></p>
+</div>
+<div id="data-table" style="margin-top: 20px; overflow-x: auto">
+<table style="width: 100%; border-collapse: collapse; margin: 20px auto">
+<thead><tr><th>Name</th><th>Data (GB)</th><th>Validity (Days)</th><th>Price</th><th>Per GB</th><th>Per day</th><th>Traffic Policy</th></tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</div>
+<script type="application/json" id="landing-state">{embedded}</script>
+</body>
+</html>
+"""
+
+
+class LandingPage:
+   def __init__(self, version, state):
+      self.version = version
+      self.state = state
+      self.slug = slugify(state["region"])
+      public = {key: value for key, value in state.items() if key not in LAYOUT_ONLY}
+      self.json = json.dumps(public, default=_json_default).encode()
+      self.html = render_html(public).encode()
+      self.etag = hashlib.sha1(self.json).hexdigest()[:16]
+
+
+# Per-destination landing pages rendered from the catalog ahead of time. `build_state` turns
+# (catalog, dataset, region) into the page state: dropdown options, the Dash table and the plan
+# list. Pages are built once per catalog version: the configured destinations eagerly on each
+# regenerate(), any other destination on its first request. A new version drops them all.
+class LandingPages:
+   def __init__(self, build_state, destinations=(), export_dir=None):
+      self.build_state = build_state
+      self.destinations = list(destinations)
+      self.export_dir = export_dir
+      self._version = None
+      self._pages = {}
+      self._lock = threading.Lock()
+
+   # (dataset, region) for a destination name or slug; single countries take precedence unless
+   # `dataset` names the one to look in.
+   def resolve(self, built, name, dataset=None):
+      datasets = (dataset,) if dataset in DATASETS else DATASETS
+      for candidate in dict.fromkeys((name, name.replace("-", " "))):
+         for dataset in datasets:
+            region = built.resolve_region(dataset, candidate)
+            if region is not None:
+               return dataset, region
+      return None
+
+   def get(self, built, name, dataset=None):
+      found = self.resolve(built, name, dataset)
+      if found is None:
+         return None
+      with self._lock:
+         if self._version != built.version:
+            self._version, self._pages = built.version, {}
+         page = self._pages.get(found)
+      if page is None:
+         page = LandingPage(built.version, self.build_state(built, *found))
+         with self._lock:
+            if self._version == built.version:
+               self._pages[found] = page
+      return page
+
+   # Rebuild the configured destinations for a new catalog version and export them if an
+   # output directory is set, so a CDN or reverse proxy can serve them as plain files.
+   def regenerate(self, built):
+      pages = [page for page in (self.get(built, name) for name in self.destinations) if page is not None]
+      if self.export_dir:
+         os.makedirs(self.export_dir, exist_ok=True)
+         for page in pages:
+            for suffix, body in ((".html", page.html), (".json", page.json)):
+               path = os.path.join(self.export_dir, page.slug + suffix)
+               tmp_path = f"{path}.{os.getpid()}.tmp"
+               with open(tmp_path, "wb") as f:
+                  f.write(body)
+               os.replace(tmp_path, path)
+      return pages
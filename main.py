@@ -1,245 +1,698 @@
+import time
+
+_startup_t0 = time.perf_counter()
+
+import atexit
+import hmac
 import dash
+import flask
 from dash import dcc, html, Input, Output, State, ALL
-import pandas as pd
 import json
 import webbrowser
 import os
+import threading
 import urllib.parse
+import uuid
+
+from alloc_profiler import DEFAULT_MIN_INTERVAL, AllocationProfiler
+from api import build_records, create_api
+from change_feed import ChangeFeed
+from currency import BASE_CURRENCY, FxRates, currency_symbol
+from landing_pages import DEFAULT_MAX_AGE, LandingPages
+from orders import AuditLog, OrderPipeline, OrderQueueFull
+from render_pool import RenderPool, build_table, component_data, table_columns
+from session_store import MemorySessionStore, create_session_store
+from throttle import SingleFlight, TokenBucketLimiter
+
+# Startup phase durations in seconds, reported on /health and printed once the catalog is ready.
+STARTUP_TIMINGS = {"imports": time.perf_counter() - _startup_t0}
 
-# Load the datasets
-file_path = os.path.dirname(os.path.abspath(__file__))
 # Load the datasets using relative paths
-country_df = pd.read_excel(os.path.join(file_path, "Country.xlsx"), sheet_name="Country")
-region_df = pd.read_excel(os.path.join(file_path, "Region.xlsx"), sheet_name="Region")
+file_path = os.path.dirname(os.path.abspath(__file__))
+
+# "lazy" serves /health straight away and builds the catalog in a background thread;
+# "eager" (default) builds it before the server starts accepting requests.
+STARTUP_MODE = os.environ.get("TRAVELESIM_STARTUP", "eager").lower()
+CATALOG_WAIT_TIMEOUT = float(os.environ.get("TRAVELESIM_CATALOG_WAIT", "60"))
+# Directory for the memory-mapped catalog shared by all worker processes (e.g. under /dev/shm).
+SHARED_CATALOG_DIR = os.environ.get("TRAVELESIM_SHARED_CATALOG")
+# Worker processes that build large tables off this process's GIL (0 keeps every render inline),
+# and the result size in rows from which a table is handed to them.
+RENDER_PROCESSES = int(os.environ.get("TRAVELESIM_RENDER_PROCESSES", "0"))
+RENDER_OFFLOAD_ROWS = int(os.environ.get("TRAVELESIM_RENDER_OFFLOAD_ROWS", "500"))
+# Destinations whose landing pages are rebuilt as soon as the catalog changes (others are built
+# on first request), an optional directory to export them to, and their HTTP cache lifetime.
+LANDING_DESTINATIONS = [name.strip() for name in
+                        os.environ.get("TRAVELESIM_LANDING_DESTINATIONS", "Europe,USA,Turkey").split(",") if name.strip()]
+LANDING_DIR = os.environ.get("TRAVELESIM_LANDING_DIR")
+LANDING_MAX_AGE = int(os.environ.get("TRAVELESIM_LANDING_MAX_AGE", str(DEFAULT_MAX_AGE)))
+# Opt-in allocation profiling of callback requests: the fraction of them to sample (0 disables),
+# the minimum seconds between samples, an optional report file rewritten every
+# TRAVELESIM_ALLOC_DUMP_INTERVAL seconds, and the token that /debug/allocations requires (it
+# refuses every request without one).
+ALLOC_PROFILE_RATE = float(os.environ.get("TRAVELESIM_ALLOC_PROFILE", "0"))
+ALLOC_MIN_INTERVAL = float(os.environ.get("TRAVELESIM_ALLOC_MIN_INTERVAL", str(DEFAULT_MIN_INTERVAL)))
+ALLOC_DUMP = os.environ.get("TRAVELESIM_ALLOC_DUMP")
+ALLOC_DUMP_INTERVAL = float(os.environ.get("TRAVELESIM_ALLOC_DUMP_INTERVAL", "60"))
+DEBUG_TOKEN = os.environ.get("TRAVELESIM_DEBUG_TOKEN")
+# Seconds between checks for replaced workbooks (0 disables hot reload).
+RELOAD_INTERVAL = float(os.environ.get("TRAVELESIM_RELOAD_INTERVAL", "30"))
+# Optional server-side session state ("memory", "memory:<max>" or "sqlite:<path>"). When set,
+# the browser only holds a session ID and the selected plan ID instead of the whole row.
+SESSION_STORE = create_session_store(
+   os.environ.get("TRAVELESIM_SESSION_STORE"),
+   ttl=float(os.environ.get("TRAVELESIM_SESSION_TTL", "1800")),
+)
+# Callback requests allowed per second per client IP, and the burst on top of that. Off by
+# default: the client IP is the proxy's unless TRAVELESIM_TRUST_PROXY is set, and behind a
+# reverse proxy or load balancer every visitor would then share one bucket.
+RATE_LIMIT = float(os.environ.get("TRAVELESIM_RATE_LIMIT", "0"))
+RATE_BURST = float(os.environ.get("TRAVELESIM_RATE_BURST", "60"))
+# Take the client IP from X-Forwarded-For (only behind a trusted reverse proxy).
+TRUST_PROXY = os.environ.get("TRAVELESIM_TRUST_PROXY", "") not in ("", "0")
+
+_limiter = TokenBucketLimiter(RATE_LIMIT, RATE_BURST) if RATE_LIMIT > 0 else None
+# Concurrent identical table queries share a single render.
+_table_flight = SingleFlight()
+# FX rates used for the currency selector, re-read from the file when it changes.
+FX_RATES = FxRates(
+   os.environ.get("TRAVELESIM_FX_RATES") or os.path.join(file_path, "fx_rates.json"),
+   refresh_interval=float(os.environ.get("TRAVELESIM_FX_REFRESH", "60")),
+)
+# Idempotency keys of submitted orders, shared between workers when the session store is.
+_order_keys = SESSION_STORE if SESSION_STORE is not None else MemorySessionStore(ttl=24 * 3600)
+# Order submission I/O runs as coroutines on an event loop (the ASGI server's own loop under
+# asgi.py, a private one otherwise), so a slow backend does not hold a server thread per order.
+ORDER_PIPELINE = OrderPipeline(
+   max_queue=int(os.environ.get("TRAVELESIM_ORDER_QUEUE", "10000")),
+   concurrency=int(os.environ.get("TRAVELESIM_ORDER_CONCURRENCY", "256")),
+)
+# Optional append-only JSON Lines audit log of accepted orders. It holds customers' names, emails
+# and phone numbers and is never rotated here, so it is off unless a path is configured.
+ORDER_LOG = os.environ.get("TRAVELESIM_ORDER_LOG")
+if ORDER_LOG:
+   ORDER_PIPELINE.add_handler(AuditLog(ORDER_LOG))
+atexit.register(ORDER_PIPELINE.close)
+
+_render_pool = None
+_alloc_profiler = AllocationProfiler(ALLOC_PROFILE_RATE, ALLOC_MIN_INTERVAL) if ALLOC_PROFILE_RATE > 0 else None
+_catalog = None
+_catalog_error = None
+_catalog_ready = threading.Event()
+_catalog_imported = threading.Event()
+# Change sets between successive catalog versions, polled through /api/v1/changes. They are kept
+# on disk next to the snapshot (or in the shared segment root), so every worker on the host
+# answers from the same history.
+CHANGE_DIR = os.environ.get("TRAVELESIM_CHANGE_DIR") or os.path.join(SHARED_CATALOG_DIR or file_path, "catalog_changes")
+_change_feed = ChangeFeed(int(os.environ.get("TRAVELESIM_CHANGE_HISTORY", "50")), CHANGE_DIR)
+# Workbook signature the first catalog load failed on; loading is retried once it changes.
+_failed_signature = None
+
+
+def _load_catalog(timings):
+   import catalog
+   if SHARED_CATALOG_DIR:
+      import shared_catalog
+      return shared_catalog.load_shared_catalog(SHARED_CATALOG_DIR, file_path, timings)
+   return catalog.load_catalog(file_path, timings)
+
+
+# Size and mtime of the workbooks, or None if they cannot be read.
+def _source_signature():
+   try:
+      import catalog
+      return catalog.source_signature(file_path)
+   except Exception:
+      return None
+
+
+def _build_catalog():
+   global _catalog, _catalog_error, _failed_signature
+   try:
+      start = time.perf_counter()
+      # Deferred import: pandas is only needed once the catalog is built.
+      try:
+         import catalog
+      finally:
+         _catalog_imported.set()
+      STARTUP_TIMINGS["catalog_import"] = time.perf_counter() - start
+      _catalog = _load_catalog(STARTUP_TIMINGS)
+      STARTUP_TIMINGS["total"] = time.perf_counter() - _startup_t0
+      warm_render_pool()
+      refresh_landing_pages()
+      print("⏱️ Startup phases: " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in STARTUP_TIMINGS.items()))
+   except Exception as e:
+      _catalog_error = str(e)
+      _failed_signature = _source_signature()
+      print(f"❌ Error loading catalog: {e}")
+   finally:
+      _catalog_ready.set()
+
+
+# Load the workbooks again if they were replaced, record what changed and swap the new
+# catalog in. Returns the change set, or None when the workbooks are unchanged. If the first
+# load failed, replaced workbooks are loaded as the first catalog instead.
+def reload_catalog():
+   global _catalog, _catalog_error, _failed_signature
+   import catalog
+   if not _catalog_ready.is_set():
+      return None
+   current = _catalog
+   signature = catalog.source_signature(file_path)
+   if current is None:
+      if signature == _failed_signature:
+         return None
+      try:
+         _catalog = _load_catalog({})
+      except Exception:
+         _failed_signature = signature
+         raise
+      _catalog_error = None
+      print(f"✅ Loaded catalog {_catalog.version} after the earlier failure")
+      warm_render_pool()
+      refresh_landing_pages()
+      return None
+   if signature == current.signature:
+      return None
+   updated = _load_catalog({})
+   change_set = _change_feed.append(current.version, updated.version, catalog.diff_catalogs(current, updated))
+   _catalog = updated
+   print(f"🔄 Reloaded catalog {current.version} -> {updated.version}: {change_set['summary']}")
+   warm_render_pool()
+   refresh_landing_pages()
+   return change_set
+
+
+def _watch_catalog():
+   while True:
+      time.sleep(RELOAD_INTERVAL)
+      try:
+         reload_catalog()
+      except Exception as e:
+         print(f"❌ Error reloading catalog: {e}")
+
+
+# Warm the render workers up with the current catalog in the background. Once it exists on disk
+# (snapshot or shared segment) they read it from there; large renders stay inline until then.
+def warm_render_pool():
+   if _render_pool is None or _catalog is None:
+      return
+   version = _catalog.version
+
+   def warm_up():
+      start = time.perf_counter()
+      try:
+         _render_pool.warm_up(version)
+         print(f"✅ Render pool warmed up with catalog {version} ({time.perf_counter() - start:.2f}s)")
+      except Exception as e:
+         print(f"❌ Render pool could not load catalog {version}: {e}")
+
+   threading.Thread(target=warm_up, name="render-pool-warm-up", daemon=True).start()
+
+
+def refresh_landing_pages():
+   try:
+      pages = LANDING_PAGES.regenerate(_catalog)
+      print(f"📄 Landing pages for catalog {_catalog.version}: {', '.join(page.slug for page in pages)}")
+   except Exception as e:
+      print(f"❌ Error building landing pages: {e}")
+
+
+def start_catalog(background):
+   if background:
+      threading.Thread(target=_build_catalog, name="catalog-loader", daemon=True).start()
+   else:
+      _build_catalog()
+   if RELOAD_INTERVAL > 0:
+      threading.Thread(target=_watch_catalog, name="catalog-watcher", daemon=True).start()
+
+
+# The catalog as it is right now, or None while it is still loading.
+def current_catalog():
+   return _catalog
 
 
-# Clean data (strip spaces and drop NaN values)
-country_df.columns = country_df.columns.str.strip()
-country_df = country_df.dropna()
-region_df.columns = region_df.columns.str.strip()
-region_df = region_df.dropna()
+# Return the dataframe for the selected dataset, waiting for the catalog if it is still loading.
+def get_catalog():
+   if not _catalog_ready.wait(CATALOG_WAIT_TIMEOUT) or _catalog is None:
+      raise dash.exceptions.PreventUpdate
+   return _catalog
+
+
+def get_dataset(selected_dataset):
+   if selected_dataset not in ('Country', 'Region'):
+      return None
+   return get_catalog().get(selected_dataset)
 
 
 # Initialize Dash app with external stylesheet
 app = dash.Dash(__name__, external_stylesheets=['/assets/styles.css'])
+server = app.server
+
 
+# Liveness probe: answers as soon as the server is up, whether or not the catalog is loaded.
+@server.route("/health")
+def health():
+   if not _catalog_ready.is_set():
+      catalog_status = "loading"
+   elif _catalog is None:
+      catalog_status = "failed"
+   else:
+      catalog_status = "ready"
+   return {"status": "ok", "catalog": catalog_status, "startup": STARTUP_TIMINGS,
+           "orders": ORDER_PIPELINE.snapshot(),
+           "render_pool": _render_pool.snapshot() if _render_pool is not None else None}
 
-# App layout
-app.layout = html.Div(
-   style={
-       "font-family": "Arial, sans-serif",
-       "padding": "20px",
-       "background": "linear-gradient(120deg, #e6e6fa 0%, #f3f3fd 100%)",
-       "min-height": "100vh"
-   },
-   children=[
-       # Title and subtitle
-       html.Div(
-           style={"text-align": "center"},
-           children=[
-               html.H1("Travel eSIM", style={"color": "#3c3c3c", "font-size": "36px", "margin-bottom": "0"}),
-               html.P("powered by Imaginize", style={"color": "#666", "font-size": "14px", "margin-top": "5px"})
-           ]
-       ),
-
-
-       # New dropdown for selecting between Country and Region
-       html.Div([
-           html.Label("Single Country / Region:", style={"font-weight": "bold", "margin-top": "10px"}),
-           dcc.Dropdown(
-               id='dataset-dropdown',
-               options=[
-                   {'label': 'Country', 'value': 'Country'},
-                   {'label': 'Region', 'value': 'Region'}
-               ],
-               placeholder="Choose a dataset",
-               style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
-           ),
-       ], style={"max-width": "600px", "margin": "0 auto"}),
-
-
-       # Dropdowns with responsive behavior
-       html.Div([
-           html.Label("Destination:", style={"font-weight": "bold", "margin-top": "10px"}),
-           dcc.Dropdown(
-               id='region-dropdown',
-               placeholder="Choose a region",
-               style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
-           ),
-       ], style={"max-width": "600px", "margin": "0 auto"}),
-
-
-       html.Div([
-           html.Label("Data (GB):", style={"font-weight": "bold"}),
-           dcc.Dropdown(
-               id='data-dropdown',
-               placeholder="Choose data",
-               style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
-           ),
-       ], style={"max-width": "600px", "margin": "0 auto"}),
-
-
-       html.Div([
-           html.Label("Validity (Days):", style={"font-weight": "bold"}),
-           dcc.Dropdown(
-               id='days-dropdown',
-               placeholder="Choose validity",
-               style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
-           ),
-       ], style={"max-width": "600px", "margin": "0 auto"}),
-
-
-       html.Div(id='data-table', style={"margin-top": "20px", "overflow-x": "auto"}),
-
-
-       html.Button(
-           "Order the eSIM now",
-           id="order-button",
-           n_clicks=0,
-           disabled=True,  # Disabled until a row is selected
-           style={
-               "display": "block",
-               "width": "200px",
-               "margin": "20px auto",
-               "padding": "12px",
-               "font-size": "16px",
-               "background-color": "#7c5cfc",
-               "color": "white",
-               "border": "none",
-               "border-radius": "8px",
-               "cursor": "pointer",
-               "box-shadow": "0px 6px 15px rgba(0, 0, 0, 0.3)",  # More prominent shadow
-               "transition": "all 0.3s ease",  # Smooth transition for hover effect
-           }
-       ),
-
-
-       # Modal for user input
-       html.Div(
-           id="modal",
-           style={
-               "display": "none",  # Hidden by default
-               "position": "fixed",
-               "top": "50%",
-               "left": "50%",
-               "transform": "translate(-50%, -50%)",
-               "background-color": "white",
-               "padding": "20px",
-               "box-shadow": "0 4px 8px rgba(0, 0, 0, 0.2)",
-               "z-index": "1000",
-               "width": "300px",
-               "border-radius": "10px"
-           },
-           children=[
-               html.H3("Enter Your Details", style={"text-align": "center", "margin-bottom": "20px"}),
-               html.Label("Name:", style={"font-weight": "bold"}),
-               dcc.Input(id="name-input", type="text", placeholder="Your Name",
-                         style={"width": "100%", "margin-bottom": "10px"}),
-               html.Label("Email:", style={"font-weight": "bold"}),
-               dcc.Input(id="email-input", type="email", placeholder="Your Email",
-                         style={"width": "100%", "margin-bottom": "10px"}),
-               html.Label("Mobile Number:", style={"font-weight": "bold"}),
-               dcc.Input(id="phone-input", type="text", placeholder="Your Mobile Number",
-                         style={"width": "100%", "margin-bottom": "20px"}),
-
-
-               html.Button(
-                   "Submit",
-                   id="submit-button",
-                   n_clicks=0,
-                   disabled=True,  # Disabled by default
-                   style={
-                       "width": "100%",
-                       "padding": "10px",
-                       "font-size": "16px",
-                       "background-color": "#7c5cfc",
-                       "color": "white",
-                       "border": "none",
-                       "border-radius": "8px",
-                       "cursor": "pointer",
-                   }
-               ),
-               html.Button(
-                   "Close",
-                   id="close-button",
-                   n_clicks=0,
-                   style={
-                       "width": "100%",
-                       "padding": "10px",
-                       "font-size": "16px",
-                       "background-color": "#f44336",  # Red color for the "Close" button
-                       "color": "white",
-                       "border": "none",
-                       "border-radius": "8px",
-                       "cursor": "pointer",
-                       "margin-top": "10px",  # Spacing between buttons
-                   }
-               ),
-               # Warning message div
-               html.Div(id="submit-warning", style={"color": "red", "text-align": "center", "margin-top": "10px"})
-           ]
-       ),
-
-
-       # Backdrop for modal
-       html.Div(
-           id="modal-backdrop",
-           style={
-               "display": "none",  # Hidden by default
-               "position": "fixed",
-               "top": "0",
-               "left": "0",
-               "width": "100%",
-               "height": "100%",
-               "background-color": "rgba(0, 0, 0, 0.5)",
-               "z-index": "999"
-           }
-       ),
-       # Store to hold selected row data
-       dcc.Store(id="selected-row-store", data={}),
-       # Store to track form submission
-       dcc.Store(id="form-submitted-store", data=False),
-       dcc.Location(id='redirect-location', refresh=True)
-
-   ]
 
-)
+# Plotly's JSON encoder inspects sys.modules["pandas"], so requests other than the probes
+# must not run while the loader thread is still halfway through importing it.
+@server.before_request
+def wait_for_catalog_import():
+   if not _catalog_imported.is_set() and flask.request.path not in ("/health", "/ready"):
+      _catalog_imported.wait(CATALOG_WAIT_TIMEOUT)
+
+
+def client_ip():
+   if TRUST_PROXY and flask.request.headers.get("X-Forwarded-For"):
+      return flask.request.headers["X-Forwarded-For"].split(",")[0].strip()
+   return flask.request.remote_addr
+
+
+def allow_request(ip):
+   return _limiter is None or _limiter.allow(ip)
+
+
+# Token-bucket rate limit on Dash callback requests (dropdowns, table, order submission).
+@server.before_request
+def rate_limit_callbacks():
+   if flask.request.path != app.config.routes_pathname_prefix + "_dash-update-component":
+      return None
+   if not allow_request(client_ip()):
+      return {"error": "Too many requests, please slow down."}, 429, {"Retry-After": "1"}
+   return None
+
+
+# Sampled allocation profiling of callback requests, covering the callback and the
+# serialization of what it returns. Keyed by the callback's output.
+@server.before_request
+def start_allocation_sample():
+   if _alloc_profiler is None or flask.request.path != app.config.routes_pathname_prefix + "_dash-update-component":
+      return None
+   payload = flask.request.get_json(silent=True) or {}
+   output = payload.get("output")
+   # Only callbacks this app defines get an entry, whatever output a client names.
+   if isinstance(output, str) and output in app.callback_map:
+      flask.g.alloc_sample = _alloc_profiler.start(output)
+   return None
+
+
+@server.teardown_request
+def stop_allocation_sample(exc):
+   if _alloc_profiler is not None:
+      _alloc_profiler.stop(flask.g.pop("alloc_sample", None))
+
+
+if _alloc_profiler is not None:
+   print(f"📊 Allocation profiling on: sampling {ALLOC_PROFILE_RATE:.1%} of callbacks, "
+         f"at most one every {ALLOC_MIN_INTERVAL:g}s")
+   if not DEBUG_TOKEN:
+      print("⚠️ /debug/allocations answers 403 until TRAVELESIM_DEBUG_TOKEN is set")
+
+   # Per-callback peak and retained allocations with their top source lines, for this process.
+   @server.route("/debug/allocations")
+   def allocation_report():
+      token = flask.request.headers.get("X-Debug-Token") or flask.request.args.get("token") or ""
+      if not DEBUG_TOKEN or not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+         return {"error": "Forbidden"}, 403
+      return _alloc_profiler.report()
+
+
+# Read-only JSON/NDJSON catalog API for partners, served next to the Dash app.
+server.register_blueprint(create_api(current_catalog, _change_feed))
 
 
+# Readiness probe: 503 until the catalog has been built.
+@server.route("/ready")
+def ready():
+   if _catalog is None:
+      return {"status": "failed" if _catalog_error else "loading", "error": _catalog_error}, 503
+   return {"status": "ready"}
+
+
+# Query string parameters that make up a shareable selection, in cascade order.
+URL_PARAMS = ("dataset", "region", "data", "days", "sort", "currency", "plan")
+
+
+def _option_value(options, raw):
+   for option in options:
+      if str(option['value']) == str(raw):
+         value = option['value']
+         return value.item() if hasattr(value, 'item') else value
+   return None
+
+
+# Resolve a shared link (?dataset=&region=&data=&days=&sort=&currency=&plan=) in one pass into
+# everything the layout starts from: each dropdown value with its options, the table and the
+# selected plan. A plan ID on its own is enough, it supplies the values above it. A value the
+# catalog does not have is dropped together with everything below it in the cascade.
+def url_state(query, session_id):
+   built = current_catalog()
+   params = {name: query[name][0] for name in URL_PARAMS if query.get(name)}
+   if built is None or not params:
+      return {}
+   dataset, region = params.get("dataset"), params.get("region")
+   data, days = params.get("data"), params.get("days")
+   sort = params.get("sort") if params.get("sort") in built.sort_keys else None
+   currency = params.get("currency") if FX_RATES.current().rate(params.get("currency")) else BASE_CURRENCY
+   plan = built.find_plan(params["plan"]) if "plan" in params else None
+   if plan is not None:
+      row = built.get(plan[0]).iloc[plan[1]]
+      dataset, region, data, days = plan[0], row['Region'], row['Data (GB)'], row['Validity (Days)']
+   elif dataset not in ('Country', 'Region') and region:
+      dataset = (LANDING_PAGES.resolve(built, region) or (None, None))[0]
+   if dataset not in ('Country', 'Region'):
+      return {}
+   region = built.resolve_region(dataset, region) if region else None
+
+   # Destination only, as linked from a landing page: reuse its prebuilt state.
+   if region is not None and plan is None and not data and not days and sort == "price" and currency == BASE_CURRENCY:
+      page = LANDING_PAGES.get(built, region, dataset)
+      if page is not None:
+         return page.state
+
+   df = built.get(dataset)
+   state = {"dataset": dataset, "sort": sort, "currency": currency, "region_options": region_options(df)}
+   if region is not None:
+      state.update(region=region, data_options=data_options(df, region))
+      state["data"] = _option_value(state["data_options"], data) if data else None
+      if state["data"] is not None:
+         state["days_options"] = days_options(df, region, state["data"])
+         state["days"] = _option_value(state["days_options"], days) if days else None
+   positions = built.select_positions(dataset, region, state.get("data"), state.get("days"), sort)
+   selected = None
+   if plan is not None:
+      hits = (positions == plan[1]).nonzero()[0]
+      if len(hits):
+         selected = int(hits[0])
+         state["selection"] = save_selection(session_id, make_selection(
+            built, dataset, plan[1], region, state.get("data"), state.get("days"), currency))
+   state["table"] = table_for(built, dataset, positions, currency, selected)
+   return state
+
+
+# The layout is fetched by the renderer after the page itself, so the page URL (and any shared
+# selection in it) comes from the Referer header.
+def requested_state(session_id):
+   if not flask.has_request_context() or not flask.request.referrer:
+      return {}
+   return url_state(urllib.parse.parse_qs(urllib.parse.urlsplit(flask.request.referrer).query), session_id)
+
+
+# App layout, built on demand for each page load, starting from the selection in the page URL
+def serve_layout():
+   session_id = uuid.uuid4().hex
+   landing = requested_state(session_id)
+   if landing.get("dataset"):
+      save_view(session_id, {field: landing.get(field) for field in VIEW_FIELDS})
+   return html.Div(
+      style={
+          "font-family": "Arial, sans-serif",
+          "padding": "20px",
+          "background": "linear-gradient(120deg, #e6e6fa 0%, #f3f3fd 100%)",
+          "min-height": "100vh"
+      },
+      children=[
+          # Title and subtitle
+          html.Div(
+              style={"text-align": "center"},
+              children=[
+                  html.H1("Travel eSIM", style={"color": "#3c3c3c", "font-size": "36px", "margin-bottom": "0"}),
+                  html.P("powered by Imaginize", style={"color": "#666", "font-size": "14px", "margin-top": "5px"})
+              ]
+          ),
+
+
+          # New dropdown for selecting between Country and Region
+          html.Div([
+              html.Label("Single Country / Region:", style={"font-weight": "bold", "margin-top": "10px"}),
+              dcc.Dropdown(
+                  id='dataset-dropdown',
+                  options=[
+                      {'label': 'Country', 'value': 'Country'},
+                      {'label': 'Region', 'value': 'Region'}
+                  ],
+                  value=landing.get("dataset"),
+                  placeholder="Choose a dataset",
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          # Dropdowns with responsive behavior
+          html.Div([
+              html.Label("Destination:", style={"font-weight": "bold", "margin-top": "10px"}),
+              dcc.Dropdown(
+                  id='region-dropdown',
+                  options=landing.get("region_options", []),
+                  value=landing.get("region"),
+                  placeholder="Choose a region",
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          html.Div([
+              html.Label("Data (GB):", style={"font-weight": "bold"}),
+              dcc.Dropdown(
+                  id='data-dropdown',
+                  options=landing.get("data_options", []),
+                  value=landing.get("data"),
+                  placeholder="Choose data",
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          html.Div([
+              html.Label("Validity (Days):", style={"font-weight": "bold"}),
+              dcc.Dropdown(
+                  id='days-dropdown',
+                  options=landing.get("days_options", []),
+                  value=landing.get("days"),
+                  placeholder="Choose validity",
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          # Sort by comparable unit cost; empty keeps the catalog order
+          html.Div([
+              html.Label("Sort by:", style={"font-weight": "bold"}),
+              dcc.Dropdown(
+                  id='sort-dropdown',
+                  options=[
+                      {'label': 'Price', 'value': 'price'},
+                      {'label': 'Price per GB', 'value': 'per_gb'},
+                      {'label': 'Price per day', 'value': 'per_day'}
+                  ],
+                  value=landing.get("sort"),
+                  placeholder="Catalog order",
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          html.Div([
+              html.Label("Currency:", style={"font-weight": "bold"}),
+              dcc.Dropdown(
+                  id='currency-dropdown',
+                  options=[{'label': code, 'value': code}
+                           for code in sorted(FX_RATES.current().rates, key=lambda c: (c != BASE_CURRENCY, c))],
+                  value=landing.get("currency", BASE_CURRENCY),
+                  clearable=False,
+                  style={"width": "100%", "max-width": "500px", "margin": "10px auto"}
+              ),
+          ], style={"max-width": "600px", "margin": "0 auto"}),
+
+
+          html.Div(id='data-table', style={"margin-top": "20px", "overflow-x": "auto"},
+                   children=landing.get("table", html.Div("Please select a dataset.", style={"color": "red"}))),
+
+
+          html.Button(
+              "Order the eSIM now",
+              id="order-button",
+              n_clicks=0,
+              disabled=True,  # Disabled until a row is selected
+              style={
+                  "display": "block",
+                  "width": "200px",
+                  "margin": "20px auto",
+                  "padding": "12px",
+                  "font-size": "16px",
+                  "background-color": "#7c5cfc",
+                  "color": "white",
+                  "border": "none",
+                  "border-radius": "8px",
+                  "cursor": "pointer",
+                  "box-shadow": "0px 6px 15px rgba(0, 0, 0, 0.3)",  # More prominent shadow
+                  "transition": "all 0.3s ease",  # Smooth transition for hover effect
+              }
+          ),
+
+
+          # Modal for user input
+          html.Div(
+              id="modal",
+              style={
+                  "display": "none",  # Hidden by default
+                  "position": "fixed",
+                  "top": "50%",
+                  "left": "50%",
+                  "transform": "translate(-50%, -50%)",
+                  "background-color": "white",
+                  "padding": "20px",
+                  "box-shadow": "0 4px 8px rgba(0, 0, 0, 0.2)",
+                  "z-index": "1000",
+                  "width": "300px",
+                  "border-radius": "10px"
+              },
+              children=[
+                  html.H3("Enter Your Details", style={"text-align": "center", "margin-bottom": "20px"}),
+                  html.Label("Name:", style={"font-weight": "bold"}),
+                  dcc.Input(id="name-input", type="text", placeholder="Your Name",
+                            style={"width": "100%", "margin-bottom": "10px"}),
+                  html.Label("Email:", style={"font-weight": "bold"}),
+                  dcc.Input(id="email-input", type="email", placeholder="Your Email",
+                            style={"width": "100%", "margin-bottom": "10px"}),
+                  html.Label("Mobile Number:", style={"font-weight": "bold"}),
+                  dcc.Input(id="phone-input", type="text", placeholder="Your Mobile Number",
+                            style={"width": "100%", "margin-bottom": "20px"}),
+
+
+                  html.Button(
+                      "Submit",
+                      id="submit-button",
+                      n_clicks=0,
+                      disabled=True,  # Disabled by default
+                      style={
+                          "width": "100%",
+                          "padding": "10px",
+                          "font-size": "16px",
+                          "background-color": "#7c5cfc",
+                          "color": "white",
+                          "border": "none",
+                          "border-radius": "8px",
+                          "cursor": "pointer",
+                      }
+                  ),
+                  html.Button(
+                      "Close",
+                      id="close-button",
+                      n_clicks=0,
+                      style={
+                          "width": "100%",
+                          "padding": "10px",
+                          "font-size": "16px",
+                          "background-color": "#f44336",  # Red color for the "Close" button
+                          "color": "white",
+                          "border": "none",
+                          "border-radius": "8px",
+                          "cursor": "pointer",
+                          "margin-top": "10px",  # Spacing between buttons
+                      }
+                  ),
+                  # Warning message div
+                  html.Div(id="submit-warning", style={"color": "red", "text-align": "center", "margin-top": "10px"})
+              ]
+          ),
+
+
+          # Backdrop for modal
+          html.Div(
+              id="modal-backdrop",
+              style={
+                  "display": "none",  # Hidden by default
+                  "position": "fixed",
+                  "top": "0",
+                  "left": "0",
+                  "width": "100%",
+                  "height": "100%",
+                  "background-color": "rgba(0, 0, 0, 0.5)",
+                  "z-index": "999"
+              }
+          ),
+          # Store to hold selected row data
+          dcc.Store(id="selected-row-store", data=landing.get("selection", {})),
+          # Per page load session key for the server-side session store
+          dcc.Store(id="session-id-store", data=session_id),
+          # Idempotency key for the order being entered, renewed each time the modal opens
+          dcc.Store(id="order-idempotency-store"),
+          # Store to track form submission
+          dcc.Store(id="form-submitted-store", data=False),
+          dcc.Location(id='redirect-location', refresh=True),
+          # Mirrors the selection into the query string so the page can be shared
+          dcc.Location(id='url', refresh=False)
+
+      ]
+
+   )
+
+
+app.layout = serve_layout
+
+
+def region_options(df):
+   return [{'label': r, 'value': r} for r in df['Region'].unique()]
+
+
+# Mask lookups rather than a groupby, which would also enumerate every category
+# combination when the catalog is attached from the shared segment.
+def data_options(df, selected_region):
+   values = df.loc[df['Region'] == selected_region, 'Data (GB)'].unique()
+   return [{'label': d, 'value': d} for d in values]
+
+
+def days_options(df, selected_region, selected_data):
+   mask = (df['Region'] == selected_region) & (df['Data (GB)'] == selected_data)
+   values = df.loc[mask, 'Validity (Days)'].unique()
+   return [{'label': d, 'value': d} for d in sorted(values, reverse=True)]
+
+
+# The cascade below starts from the values and options serve_layout filled in, so none of it
+# runs on page load.
+
 # Update Region dropdown based on Dataset selection
 @app.callback(
    Output('region-dropdown', 'options'),
-   Input('dataset-dropdown', 'value')
+   Input('dataset-dropdown', 'value'),
+   prevent_initial_call=True
 )
 def update_region_dropdown(selected_dataset):
-   if selected_dataset == 'Country':
-       df = country_df
-   elif selected_dataset == 'Region':
-       df = region_df
-   else:
+   df = get_dataset(selected_dataset)
+   if df is None:
        return []
-   return [{'label': r, 'value': r} for r in df['Region'].unique()]
+   return region_options(df)
 
 
 # Update Data dropdown based on Region selection
 @app.callback(
    Output('data-dropdown', 'options'),
    [Input('dataset-dropdown', 'value'),
-    Input('region-dropdown', 'value')]
+    Input('region-dropdown', 'value')],
+   prevent_initial_call=True
 )
 def update_data_dropdown(selected_dataset, selected_region):
    if not selected_dataset or not selected_region:
        return []
 
 
-   if selected_dataset == 'Country':
-       df = country_df
-   elif selected_dataset == 'Region':
-       df = region_df
+   df = get_dataset(selected_dataset)
+   if df is None:
+       return []
 
 
-   data_options = df.groupby('Region')['Data (GB)'].unique().to_dict()
-   return [{'label': d, 'value': d} for d in data_options.get(selected_region, [])]
+   return data_options(df, selected_region)
 
 
 # Update Validity dropdown based on Data selection
@@ -247,21 +700,20 @@ def update_data_dropdown(selected_dataset, selected_region):
    Output('days-dropdown', 'options'),
    [Input('dataset-dropdown', 'value'),
     Input('region-dropdown', 'value'),
-    Input('data-dropdown', 'value')]
+    Input('data-dropdown', 'value')],
+   prevent_initial_call=True
 )
 def update_days_dropdown(selected_dataset, selected_region, selected_data):
    if not selected_dataset or not selected_region or not selected_data:
        return []
 
 
-   if selected_dataset == 'Country':
-       df = country_df
-   elif selected_dataset == 'Region':
-       df = region_df
+   df = get_dataset(selected_dataset)
+   if df is None:
+       return []
 
 
-   days_options = df.groupby(['Region', 'Data (GB)'])['Validity (Days)'].unique().to_dict()
-   return [{'label': d, 'value': d} for d in sorted(days_options.get((selected_region, selected_data), []), reverse=True)]
+   return days_options(df, selected_region, selected_data)
 
 
 # Update table based on selections and render clickable rows.
@@ -270,74 +722,105 @@ def update_days_dropdown(selected_dataset, selected_region, selected_data):
    [Input('dataset-dropdown', 'value'),
     Input('region-dropdown', 'value'),
     Input('data-dropdown', 'value'),
-    Input('days-dropdown', 'value')]
+    Input('days-dropdown', 'value'),
+    Input('sort-dropdown', 'value'),
+    Input('currency-dropdown', 'value')],
+   State('session-id-store', 'data'),
+   prevent_initial_call=True
 )
-def update_table(selected_dataset, selected_region, selected_data, selected_days):
+def update_table(selected_dataset, selected_region, selected_data, selected_days, selected_sort, selected_currency,
+                 session_id):
+   key = (selected_dataset, selected_region, selected_data, selected_days, selected_sort, selected_currency)
+   # Row clicks are resolved against the view the table was last rendered for.
+   save_view(session_id, dict(zip(VIEW_FIELDS, key)))
+   return _table_flight.do(key, lambda: render_table(*key))
+
+
+# Arguments for Catalog.price_labels in the selected currency (falls back to EUR if it has no rate).
+def price_format(selected_currency):
+   fx = FX_RATES.current()
+   currency = selected_currency if fx.rate(selected_currency) else BASE_CURRENCY
+   return {"currency": currency, "symbol": currency_symbol(currency), "rate": fx.rate(currency),
+           "rate_version": fx.version}
+
+
+# The table for the rows at `positions`, with row `selected` starting out clicked.
+def table_for(built, dataset, positions, selected_currency, selected=None):
+   fmt = price_format(selected_currency)
+   # Large results are built in the render pool so they do not stall other callbacks here.
+   if _render_pool is not None and _render_pool.offloads(len(positions)):
+       table = _render_pool.render(built.version, dataset, positions, fmt, selected)
+       if table is not None:
+           return table
+   return build_table(table_columns(built, dataset, positions, fmt), selected)
+
+
+def render_table(selected_dataset, selected_region, selected_data, selected_days, selected_sort=None,
+                 selected_currency=BASE_CURRENCY):
    try:
-       if selected_dataset == 'Country':
-           df = country_df
-       elif selected_dataset == 'Region':
-           df = region_df
-       else:
+       df = get_dataset(selected_dataset)
+       if df is None:
            return html.Div("Please select a dataset.", style={"color": "red"})
 
+       catalog = get_catalog()
+       positions = catalog.select_positions(selected_dataset, selected_region, selected_data,
+                                            selected_days, selected_sort)
+
 
-       filtered_df = df.copy()
-       if selected_region:
-           filtered_df = filtered_df[filtered_df['Region'] == selected_region]
-       if selected_data:
-           filtered_df = filtered_df[filtered_df['Data (GB)'] == selected_data]
-       if selected_days:
-           filtered_df = filtered_df[filtered_df['Validity (Days)'] == selected_days]
-
-
-       # Define required columns for display; exclude "ID" from the table.
-       display_columns = ['Name', 'Coverage', 'RRP info', 'Wi-Fi Hotspot', 'Traffic Policy']
-       # Use only display_columns if available
-       filtered_df = filtered_df[[col for col in display_columns if col in filtered_df.columns]]
-
-
-       # Add Euro sign to RRP info if present
-       if 'RRP info' in filtered_df.columns:
-           filtered_df['RRP info'] = filtered_df['RRP info'].apply(lambda x: f"€{x}")
-
-
-       table = html.Table(
-           style={"width": "100%", "border-collapse": "collapse", "margin": "20px auto"},
-           children=[
-               html.Thead(
-                   html.Tr([
-                       html.Th(
-                           col,
-                           style={
-                               "padding": "12px",
-                               "border": "1px solid #ddd",
-                               "background-color": "#6A4AE2",
-                               "color": "white",
-                               "cursor": "pointer"  # Add cursor indication
-                           }
-                       ) for col in filtered_df.columns
-                   ])
-               ),
-               html.Tbody([
-                   html.Tr(
-                       id={"type": "table-row", "index": i},
-                       children=[
-                           html.Td(filtered_df.iloc[i][col], style={"padding": "8px", "border": "1px solid #ddd",
-                                                                    "transition": "all 0.2s ease"})
-                           for col in filtered_df.columns],
-                       style={"cursor": "pointer", "background-color": "#f9f9f9"},
-                       n_clicks=0
-                   ) for i in range(len(filtered_df))
-               ])
-           ]
-       )
-       return table
+       return table_for(catalog, selected_dataset, positions, selected_currency)
+   except dash.exceptions.PreventUpdate:
+       raise
    except Exception as e:
        print(f"❌ Error in update_table: {e}")
        return html.Div("❌ An error occurred while updating the table.", style={"color": "red"})
 
 
+LANDING_FIELDS = ["id", "name", "data_gb", "validity_days", "price_eur", "eur_per_gb", "eur_per_day",
+                  "wifi_hotspot", "traffic_policy"]
+
+
+# The app with only a destination chosen, sorted by price: what its landing page shows and what
+# the Dash layout starts from when opened from there.
+def landing_state(built, dataset, region):
+   df = built.get(dataset)
+   positions = built.select_positions(dataset, region, sort="price")
+   fmt = price_format(BASE_CURRENCY)
+   return {
+      "catalog_version": built.version,
+      "dataset": dataset,
+      "region": region,
+      "sort": "price",
+      "currency": BASE_CURRENCY,
+      "app_url": app.config.requests_pathname_prefix + "?" + urllib.parse.urlencode({"dataset": dataset, "region": region, "sort": "price"}),
+      "region_options": region_options(df),
+      "data_options": data_options(df, region),
+      "table": component_data(build_table(table_columns(built, dataset, positions, fmt))),
+      "plans": build_records(built, dataset, positions, LANDING_FIELDS),
+   }
+
+
+LANDING_PAGES = LandingPages(landing_state, LANDING_DESTINATIONS, LANDING_DIR)
+
+
+# Static landing page for a destination (/destination/france), or its state as JSON
+# (/destination/france.json). Both change only with the catalog version.
+@server.route("/destination/<name>")
+def destination_page(name):
+   built = current_catalog()
+   if built is None:
+      return {"error": "The catalog is still loading"}, 503, {"Retry-After": "5"}
+   as_json = name.endswith(".json")
+   page = LANDING_PAGES.get(built, name[:-len(".json")] if as_json else name)
+   if page is None:
+      return {"error": f"No destination named {name}"}, 404
+   response = flask.Response(page.json if as_json else page.html,
+                             mimetype="application/json" if as_json else "text/html")
+   response.set_etag(page.etag + ("-json" if as_json else "-html"))
+   response.headers["Cache-Control"] = f"public, max-age={LANDING_MAX_AGE}"
+   response.headers["X-Catalog-Version"] = page.version
+   return response.make_conditional(flask.request)
+
+
 # Enable/disable the "Order the eSIM now" button based on row selection.
 @app.callback(
    Output('order-button', 'disabled'),
@@ -350,38 +833,66 @@ def enable_order_button(row_clicks):
    return True
 
 
+# Dropdown values a table is rendered from, in callback order.
+VIEW_FIELDS = ("dataset", "region", "data", "days", "sort", "currency")
+
+
+# With the session store on, remember the dropdown values the session's table was rendered
+# from, so a row click only has to send the session ID.
+def save_view(session_id, view):
+   if SESSION_STORE is not None and session_id:
+       SESSION_STORE.set(f"view:{session_id}", view)
+
+
+def load_view(session_id):
+   return (SESSION_STORE.get(f"view:{session_id}") if session_id else None) or {}
+
+
 # Store the data of the selected row in a dcc.Store.
-@app.callback(
-   Output('selected-row-store', 'data'),
-   Input({'type': 'table-row', 'index': ALL}, 'n_clicks'),
-   [State('dataset-dropdown', 'value'),
-    State('region-dropdown', 'value'),
-    State('data-dropdown', 'value'),
-    State('days-dropdown', 'value')]
-)
-def store_selected_row(row_clicks, selected_dataset, selected_region, selected_data, selected_days):
+if SESSION_STORE is None:
+   @app.callback(
+      Output('selected-row-store', 'data'),
+      Input({'type': 'table-row', 'index': ALL}, 'n_clicks'),
+      [State('dataset-dropdown', 'value'),
+       State('region-dropdown', 'value'),
+       State('data-dropdown', 'value'),
+       State('days-dropdown', 'value'),
+       State('sort-dropdown', 'value'),
+       State('currency-dropdown', 'value'),
+       State('session-id-store', 'data')]
+   )
+   def store_selected_row(row_clicks, selected_dataset, selected_region, selected_data, selected_days,
+                          selected_sort, selected_currency, session_id):
+      return select_row(selected_dataset, selected_region, selected_data, selected_days, selected_sort,
+                        selected_currency, session_id)
+else:
+   # The dropdown values come from the view saved with the session, not from the browser.
+   @app.callback(
+      Output('selected-row-store', 'data'),
+      Input({'type': 'table-row', 'index': ALL}, 'n_clicks'),
+      State('session-id-store', 'data')
+   )
+   def store_selected_row(row_clicks, session_id):
+      view = load_view(session_id)
+      return select_row(*(view.get(field) for field in VIEW_FIELDS), session_id)
+
+
+def select_row(selected_dataset, selected_region, selected_data, selected_days, selected_sort,
+               selected_currency, session_id):
    ctx = dash.callback_context
    if not ctx.triggered:
        return dash.no_update
 
 
-   if selected_dataset == 'Country':
-       df = country_df
-   elif selected_dataset == 'Region':
-       df = region_df
-   else:
+   df = get_dataset(selected_dataset)
+   if df is None:
        return dash.no_update
 
 
-   # Recreate filtered dataframe as in update_table.
-   filtered_df = df.copy()
-   if selected_region:
-       filtered_df = filtered_df[filtered_df['Region'] == selected_region]
-   if selected_data:
-       filtered_df = filtered_df[filtered_df['Data (GB)'] == selected_data]
-   if selected_days:
-       filtered_df = filtered_df[filtered_df['Validity (Days)'] == selected_days]
-   filtered_df = filtered_df.reset_index(drop=True)
+   # Recreate the row order shown by update_table.
+   catalog = get_catalog()
+   positions = catalog.select_positions(selected_dataset, selected_region, selected_data,
+                                        selected_days, selected_sort)
 
 
    # Get the triggered row's id from the context.
@@ -393,15 +904,114 @@ def store_selected_row(row_clicks, selected_dataset, selected_region, selected_d
 
 
    index = id_dict.get('index')
-   if index is not None and index < len(filtered_df):
-       return filtered_df.iloc[index].to_dict()
-   return dash.no_update
+   if index is None or index >= len(positions):
+       return dash.no_update
+
+   selection = make_selection(catalog, selected_dataset, positions[index], selected_region, selected_data,
+                              selected_days, selected_currency)
+   return save_selection(session_id, selection)
+
+
+# What the order form needs about a chosen plan: the dropdown values it was chosen under, its
+# price in the selected currency and its catalog row.
+def make_selection(built, dataset, position, region, data, days, selected_currency=BASE_CURRENCY):
+   row = {col: value.item() if hasattr(value, 'item') else value
+          for col, value in built.get(dataset).iloc[position].to_dict().items()}
+   price = built.price_labels(dataset, 'price_cents', **price_format(selected_currency))[position]
+   return {"dataset": dataset, "region": region, "data": data, "days": days, "price": price, "row": row}
+
+
+# The selected-row-store value for a selection.
+def save_selection(session_id, selection):
+   if SESSION_STORE is None:
+       return selection
+   # Keep the selection on the server and only hand the browser the plan ID.
+   SESSION_STORE.set(session_id, selection)
+   return {"ID": selection["row"].get("ID")}
+
+
+# Resolve the selection saved by store_selected_row, from the session store when enabled.
+def load_selection(session_id, selected_row):
+   if SESSION_STORE is None:
+       return selected_row or {}
+   return SESSION_STORE.get(session_id) or {}
+
+
+# The selection store_selected_row would save for a plan picked by ID (used by the async
+# order endpoint in asgi.py). None when no plan has that ID.
+def plan_selection(built, plan_id):
+   found = built.find_plan(plan_id)
+   if found is None:
+      return None
+   dataset, position = found
+   selection = make_selection(built, dataset, position, None, None, None)
+   row = selection["row"]
+   selection.update(region=row.get("Region"), data=row.get("Data (GB)"), days=row.get("Validity (Days)"))
+   return selection
+
+
+# Claim an order form's idempotency key; False when that form was already submitted.
+def claim_order(idempotency_key, session_id=None):
+   return not idempotency_key or _order_keys.add(f"order:{idempotency_key}", session_id)
+
+
+# Give a claimed key back when its order could not be queued, so a retry is not a duplicate.
+def release_order(idempotency_key):
+   if idempotency_key:
+      _order_keys.delete(f"order:{idempotency_key}")
+
+
+# Order record handed to ORDER_PIPELINE; this is also what the audit log stores.
+def build_order(name, email, phone, selection, idempotency_key, source):
+   row = selection.get("row") or {}
+   return {
+      "order_id": uuid.uuid4().hex,
+      "idempotency_key": idempotency_key,
+      "received_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+      "source": source,
+      "name": name,
+      "email": email,
+      "phone": phone,
+      "dataset": selection.get("dataset"),
+      "region": selection.get("region"),
+      "data": selection.get("data"),
+      "days": selection.get("days"),
+      "plan_id": row.get("ID"),
+      "traffic_policy": row.get("Traffic Policy"),
+      "price": selection.get("price", row.get("RRP info")),
+   }
+
+
+# Keep the query string in step with the selection. The plan is only kept when the row click
+# itself triggered this; any dropdown change may take the plan out of the table.
+@app.callback(
+   Output('url', 'search'),
+   [Input('dataset-dropdown', 'value'),
+    Input('region-dropdown', 'value'),
+    Input('data-dropdown', 'value'),
+    Input('days-dropdown', 'value'),
+    Input('sort-dropdown', 'value'),
+    Input('currency-dropdown', 'value'),
+    Input('selected-row-store', 'data')],
+   prevent_initial_call=True
+)
+def sync_url(selected_dataset, selected_region, selected_data, selected_days, selected_sort,
+             selected_currency, selected_row):
+   params = {"dataset": selected_dataset, "region": selected_region, "data": selected_data,
+             "days": selected_days, "sort": selected_sort}
+   if selected_currency != BASE_CURRENCY:
+       params["currency"] = selected_currency
+   if dash.callback_context.triggered_id == 'selected-row-store' and selected_row:
+       params["plan"] = selected_row.get("ID") or (selected_row.get("row") or {}).get("ID")
+   params = {name: value for name, value in params.items() if value not in (None, "")}
+   return "?" + urllib.parse.urlencode(params) if params else ""
 
 
 # Show/hide modal and backdrop for user input.
 @app.callback(
    [Output('modal', 'style'),
-    Output('modal-backdrop', 'style')],
+    Output('modal-backdrop', 'style'),
+    Output('order-idempotency-store', 'data')],
    [Input('order-button', 'n_clicks'),
     Input('close-button', 'n_clicks'),
     Input('submit-button', 'n_clicks')],
@@ -411,15 +1021,17 @@ def store_selected_row(row_clicks, selected_dataset, selected_region, selected_d
 def toggle_modal(order_clicks, close_clicks, submit_clicks, modal_style, backdrop_style):
    ctx = dash.callback_context
    if not ctx.triggered:
-       return modal_style, backdrop_style
+       return modal_style, backdrop_style, dash.no_update
    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
    if button_id == "order-button" and order_clicks > 0:
        modal_style["display"] = "block"
        backdrop_style["display"] = "block"
+       # A fresh key per opened order form; repeated submits of this form reuse it.
+       return modal_style, backdrop_style, uuid.uuid4().hex
    elif button_id in ["close-button", "submit-button"]:
        modal_style["display"] = "none"
        backdrop_style["display"] = "none"
-   return modal_style, backdrop_style
+   return modal_style, backdrop_style, dash.no_update
 
 
 # Enable/disable the Submit button based on form completion
@@ -455,36 +1067,51 @@ def show_warning(submit_clicks, name, email, phone):
    [State('name-input', 'value'),
     State('email-input', 'value'),
     State('phone-input', 'value'),
-    State('dataset-dropdown', 'value'),
-    State('region-dropdown', 'value'),
-    State('data-dropdown', 'value'),
-    State('days-dropdown', 'value'),
-    State('selected-row-store', 'data')],
+    State('selected-row-store', 'data'),
+    State('session-id-store', 'data'),
+    State('order-idempotency-store', 'data')],
    prevent_initial_call=True  # Prevent callback from firing on initial load
 )
-def handle_submit(submit_clicks, name, email, phone, selected_dataset, region, data, days, selected_row):
+def handle_submit(submit_clicks, name, email, phone, selected_row_data, session_id, idempotency_key):
     if submit_clicks > 0:
         # Check if all fields are filled
         if not all([name, email, phone]):
             return dash.no_update  # Do not proceed if any field is empty
 
+        # Record each order form once, however many times Submit fires for it.
+        if not claim_order(idempotency_key, session_id):
+            print(f"🔁 Ignoring duplicate submit for order {idempotency_key}")
+            return dash.no_update
+
+        # The dropdown values were captured together with the selected row.
+        selection = load_selection(session_id, selected_row_data)
+        region = selection.get("region")
+        selected_row = selection.get("row") or {}
+
         # Use selected_row to retrieve Traffic Policy and ID.
-        traffic_policy = selected_row.get("Traffic Policy", "N/A") if selected_row else "N/A"
-        id_value = selected_row.get("ID", "N/A") if selected_row else "N/A"
+        traffic_policy = selected_row.get("Traffic Policy", "N/A")
+        id_value = selected_row.get("ID", "N/A")
         order_summary = (
             f"Full Name: {name}\n"
             f"Email: {email}\n"
             f"Mobile number: {phone}\n"
-            f"Dataset: {selected_dataset}\n"
+            f"Dataset: {selection.get('dataset')}\n"
             f"Region: {region}\n"
-            f"Data: {data} GB\n"
-            f"Validity: {days} Days\n"
+            f"Data: {selection.get('data')} GB\n"
+            f"Validity: {selection.get('days')} Days\n"
             f"Traffic Policy: {traffic_policy}\n"
-            f"Price: {selected_row.get('RRP info', 'N/A')}\n"
+            f"Price: {selection.get('price', selected_row.get('RRP info', 'N/A'))}\n"
             f"ID: {id_value}"
         )
         print(f"📝 Order Summary:\n{order_summary}")
 
+        # Audit log and any other order I/O run on the pipeline's event loop, not this thread.
+        try:
+            ORDER_PIPELINE.submit_threadsafe(build_order(name, email, phone, selection, idempotency_key, "dash"))
+        except OrderQueueFull as e:
+            release_order(idempotency_key)
+            print(f"⚠️ Order for plan {id_value} was not queued: {e}")
+
         # URL-encode components
         encoded_subject = urllib.parse.quote(f"New order for eSIM for {region}")
         encoded_body = urllib.parse.quote(order_summary)
@@ -498,4 +1125,16 @@ def handle_submit(submit_clicks, name, email, phone, selected_dataset, region, d
         return outlook_url
     return dash.no_update
 
-app.run_server(host='0.0.0.0', port=8000, debug=False)
\ No newline at end of file
+# Fork the render workers before start_catalog starts any threads.
+if RENDER_PROCESSES > 0:
+   _render_pool = RenderPool(RENDER_PROCESSES, file_path, SHARED_CATALOG_DIR, RENDER_OFFLOAD_ROWS)
+   _render_pool.start()
+   atexit.register(_render_pool.shutdown)
+
+if _alloc_profiler is not None and ALLOC_DUMP:
+   _alloc_profiler.start_dumping(ALLOC_DUMP, ALLOC_DUMP_INTERVAL)
+
+start_catalog(background=STARTUP_MODE == "lazy")
+
+if __name__ == "__main__":
+   app.run_server(host='0.0.0.0', port=8000, debug=False)
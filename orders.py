@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_CONCURRENCY = 256
+SUBMIT_TIMEOUT = 5
+
+
+class OrderQueueFull(Exception):
+   pass
+
+
+# Appends each order to a JSON Lines file. The blocking write runs in the loop's default
+# executor so the event loop keeps accepting other submits meanwhile.
+class AuditLog:
+   def __init__(self, path):
+      self.path = path
+      self._lock = threading.Lock()
+
+   async def __call__(self, order):
+      await asyncio.get_running_loop().run_in_executor(None, self._append, json.dumps(order) + "\n")
+
+   def _append(self, line):
+      with self._lock, open(self.path, "a", encoding="utf-8") as f:
+         f.write(line)
+
+
+# Order submission I/O (audit log, queueing, email) as coroutines on one event loop. Submitting
+# only puts the order on a bounded queue; `concurrency` worker coroutines then run every handler
+# for it in turn, so thousands of slow in-flight orders cost tasks rather than threads.
+#
+# Under an ASGI server the pipeline is started on the server's own loop (see asgi.py). Under a
+# threaded WSGI server the first submit starts a private loop in a daemon thread instead.
+class OrderPipeline:
+   def __init__(self, handlers=(), max_queue=DEFAULT_QUEUE_SIZE, concurrency=DEFAULT_CONCURRENCY):
+      self.handlers = list(handlers)
+      self.max_queue = max_queue
+      self.concurrency = concurrency
+      self.stats = Counter()
+      self._loop = None
+      self._queue = None
+      self._workers = []
+      self._own_thread = None
+      self._lock = threading.Lock()
+
+   def add_handler(self, handler):
+      self.handlers.append(handler)
+
+   # Run the workers on the current loop. Idempotent, so every ASGI request may call it.
+   async def start(self):
+      if self._loop is not None:
+         return
+      self._loop = asyncio.get_running_loop()
+      self._queue = asyncio.Queue(self.max_queue)
+      self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+
+   # Wait for queued orders to finish, then stop the workers.
+   async def stop(self):
+      if self._queue is None:
+         return
+      await self._queue.join()
+      for worker in self._workers:
+         worker.cancel()
+      await asyncio.gather(*self._workers, return_exceptions=True)
+      self._workers = []
+
+   def _start_thread(self):
+      loop = asyncio.new_event_loop()
+      started = threading.Event()
+
+      def run():
+         asyncio.set_event_loop(loop)
+         loop.run_until_complete(self.start())
+         started.set()
+         loop.run_forever()
+
+      self._own_thread = threading.Thread(target=run, name="order-pipeline", daemon=True)
+      self._own_thread.start()
+      started.wait()
+
+   # Enqueue from a coroutine running on the pipeline's loop.
+   async def submit(self, order):
+      try:
+         self._queue.put_nowait(order)
+      except asyncio.QueueFull:
+         self.stats["rejected"] += 1
+         raise OrderQueueFull(f"{self._queue.qsize()} orders already queued")
+      self.stats["submitted"] += 1
+
+   # Enqueue from a server worker thread. Returns as soon as the order is queued; the handlers
+   # run later on the loop.
+   def submit_threadsafe(self, order):
+      with self._lock:
+         if self._loop is None:
+            self._start_thread()
+      return asyncio.run_coroutine_threadsafe(self.submit(order), self._loop).result(SUBMIT_TIMEOUT)
+
+   # Drain the private loop on interpreter exit; a no-op when the ASGI server owns the loop.
+   def close(self, timeout=SUBMIT_TIMEOUT):
+      if self._own_thread is None:
+         return
+      try:
+         asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result(timeout)
+      except Exception as e:
+         print(f"⚠️ Order pipeline did not drain: {e}")
+      self._loop.call_soon_threadsafe(self._loop.stop)
+
+   def snapshot(self):
+      return {
+         "queued": self._queue.qsize() if self._queue is not None else 0,
+         "running": self._loop is not None,
+         **self.stats,
+      }
+
+   async def _work(self):
+      while True:
+         order = await self._queue.get()
+         start = time.perf_counter()
+         try:
+            for handler in self.handlers:
+               await handler(order)
+            self.stats["completed"] += 1
+         except Exception as e:
+            self.stats["failed"] += 1
+            print(f"❌ Order {order.get('order_id')} failed after {time.perf_counter() - start:.2f}s: {e}")
+         finally:
+            self._queue.task_done()
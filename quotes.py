@@ -0,0 +1,283 @@
+import heapq
+import math
+import re
+import threading
+
+import numpy as np
+
+# Itinerary quotes: the cheapest set of plans covering a list of legs (destination, data, days),
+# where one Region plan may cover several legs of the trip.
+MAX_LEGS = 10
+DEFAULT_ALTERNATIVES = 3
+MAX_ALTERNATIVES = 10
+UNLIMITED = "Unlimited"
+
+# ISO 3166 alpha-2 codes of the Country dataset's destinations. Region plans list their
+# coverage as these codes ("13 Countries: AU CN HK ..."); a destination without a code here can
+# still be quoted with its own country plans.
+COUNTRY_CODES = {
+   "Afghanistan": "AF", "Albania": "AL", "Algeria": "DZ", "Andorra": "AD", "Anguilla": "AI",
+   "Antigua and Barbuda": "AG", "Argentina": "AR", "Armenia": "AM", "Aruba": "AW", "Australia": "AU",
+   "Austria": "AT", "Azerbaijan": "AZ", "Bahamas": "BS", "Bahrain": "BH", "Bangladesh": "BD",
+   "Barbados": "BB", "Belgium": "BE", "Belize": "BZ", "Benin": "BJ", "Bermuda": "BM", "Bhutan": "BT",
+   "Bolivia": "BO", "Bonaire": "BQ", "Bosnia": "BA", "Botswana": "BW", "Brazil": "BR",
+   "British Virgin Islands": "VG", "Brunei": "BN", "Bulgaria": "BG", "Burkina Faso": "BF",
+   "Burundi": "BI", "Cambodia": "KH", "Cameroon": "CM", "Canada": "CA", "Cape Verde": "CV",
+   "Cayman Islands": "KY", "Chad": "TD", "Chile": "CL", "China": "CN", "Colombia": "CO",
+   "Costa Rica": "CR", "Croatia": "HR", "Curacao": "CW", "Cyprus": "CY", "Czech Republic": "CZ",
+   "Democratic Republic of the Congo": "CD", "Denmark": "DK", "Dominica": "DM",
+   "Dominican Republic": "DO", "Ecuador": "EC", "Egypt": "EG", "El Salvador": "SV", "Estonia": "EE",
+   "Ethiopia": "ET", "Falkland Islands": "FK", "Faroe Islands": "FO", "Fiji": "FJ", "Finland": "FI",
+   "France": "FR", "French Guiana": "GF", "French Polynesia": "PF", "Gabon": "GA", "Gambia": "GM",
+   "Georgia": "GE", "Germany": "DE", "Ghana": "GH", "Gibraltar": "GI", "Greece": "GR",
+   "Greenland": "GL", "Grenada": "GD", "Guadeloupe": "GP", "Guam": "GU", "Guatemala": "GT",
+   "Guernsey": "GG", "Guinea": "GN", "Guinea-Bissau": "GW", "Guyana": "GY", "Haiti": "HT",
+   "Honduras": "HN", "Hong Kong": "HK", "Hungary": "HU", "Iceland": "IS", "India": "IN",
+   "Indonesia": "ID", "Iraq": "IQ", "Ireland": "IE", "Isle of Man": "IM", "Israel": "IL", "Italy": "IT",
+   "Ivory Coast": "CI", "Jamaica": "JM", "Japan": "JP", "Jersey": "JE", "Jordan": "JO",
+   "Kazakhstan": "KZ", "Kenya": "KE", "Kiribati": "KI", "Kosovo": "XK", "Kuwait": "KW",
+   "Kyrgyzstan": "KG", "Laos": "LA", "Latvia": "LV", "Liberia": "LR", "Liechtenstein": "LI",
+   "Lithuania": "LT", "Luxembourg": "LU", "Macau": "MO", "Macedonia": "MK", "Madagascar": "MG",
+   "Malawi": "MW", "Malaysia": "MY", "Maldives": "MV", "Mali": "ML", "Malta": "MT", "Martinique": "MQ",
+   "Mauritania": "MR", "Mauritius": "MU", "Mayotte": "YT", "Mexico": "MX", "Moldova": "MD",
+   "Monaco": "MC", "Mongolia": "MN", "Montenegro": "ME", "Montserrat": "MS", "Morocco": "MA",
+   "Mozambique": "MZ", "Nauru": "NR", "Nepal": "NP", "Netherlands": "NL", "Netherlands Antilles": "AN",
+   "New Zealand": "NZ", "Nicaragua": "NI", "Niger": "NE", "Nigeria": "NG", "Norway": "NO", "Oman": "OM",
+   "Pakistan": "PK", "Panama": "PA", "Papua New Guinea": "PG", "Paraguay": "PY", "Peru": "PE",
+   "Philippines": "PH", "Poland": "PL", "Portugal": "PT", "Puerto Rico": "PR", "Qatar": "QA",
+   "Republic of the Congo": "CG", "Reunion": "RE", "Romania": "RO", "Russia": "RU", "Rwanda": "RW",
+   "Saint Barthelemy": "BL", "Saint Kitts and Nevis": "KN", "Saint Lucia": "LC", "Saint Martin": "MF",
+   "Saipan (CNMI)": "MP", "Samoa": "WS", "San Marino": "SM", "Saudi Arabia": "SA", "Senegal": "SN",
+   "Serbia": "RS", "Seychelles": "SC", "Singapore": "SG", "Sint Maarten": "SX", "Slovakia": "SK",
+   "Slovenia": "SI", "South Africa": "ZA", "South Korea": "KR", "Spain": "ES", "Sri Lanka": "LK",
+   "St. Vincent and the Grenadines": "VC", "Sudan": "SD", "Suriname": "SR", "Swaziland": "SZ",
+   "Sweden": "SE", "Switzerland": "CH", "Taiwan": "TW", "Tajikistan": "TJ", "Tanzania": "TZ",
+   "Thailand": "TH", "Timor-Leste": "TL", "Togo": "TG", "Tonga": "TO", "Trinidad and Tobago": "TT",
+   "Tunisia": "TN", "Turkey": "TR", "Turks and Caicos Islands": "TC", "U.S. Virgin Islands": "VI",
+   "UK": "GB", "USA": "US", "Uganda": "UG", "Ukraine": "UA", "United Arab Emirates": "AE",
+   "Uruguay": "UY", "Uzbekistan": "UZ", "Vanuatu": "VU", "Venezuela": "VE", "Vietnam": "VN",
+   "Zambia": "ZM",
+}
+_CODE = re.compile(r"\b[A-Z]{2}\b")
+
+
+class QuoteError(ValueError):
+   pass
+
+
+# ISO codes listed in a Region plan's Coverage cell; the "N Countries:" prefix is skipped.
+def coverage_codes(coverage):
+   text = str(coverage)
+   return _CODE.findall(text.split(":", 1)[1] if ":" in text else text)
+
+
+# Data volume in GB as a number; "Unlimited" compares above every finite volume and is the only
+# way to ask for one ("nan" or "inf" are rejected).
+def data_volume(value):
+   if isinstance(value, str) and value.strip().casefold() == UNLIMITED.casefold():
+      return np.inf
+   if isinstance(value, bool):
+      raise ValueError(f"data volume {value!r} is not a number")
+   volume = float(value)
+   if not math.isfinite(volume):
+      raise ValueError(f"data volume {value!r} is not a number")
+   return volume
+
+
+# Validity in whole days; 7.9 or true are rejected rather than read as 7 or 1 day.
+def day_count(value):
+   if isinstance(value, bool):
+      raise ValueError(f"days {value!r} is not a whole number")
+   days = float(value) if isinstance(value, str) else value
+   if isinstance(days, float) and not days.is_integer():
+      raise ValueError(f"days {value!r} is not a whole number")
+   return int(days)
+
+
+# A data volume as the catalog writes it: whole GB as int, inf as "Unlimited".
+def data_label(value):
+   if value == np.inf:
+      return UNLIMITED
+   return int(value) if float(value).is_integer() else value
+
+
+# Every plan of both datasets as flat arrays, plus a (destination x plan) coverage matrix: a
+# country plan covers its own destination, a Region plan each destination its Coverage lists.
+# Built once per catalog version.
+class QuoteIndex:
+   def __init__(self, built):
+      self.version = built.version
+      countries = built.get("Country")
+      self.destinations = [str(name) for name in countries['Region'].unique()]
+      column = {name: i for i, name in enumerate(self.destinations)}
+      by_code = {COUNTRY_CODES[name]: i for name, i in column.items() if name in COUNTRY_CODES}
+      self.codes = {code: self.destinations[i] for code, i in by_code.items()}
+
+      datasets, positions, prices, data, days = [], [], [], [], []
+      covered = []
+      for dataset in ("Country", "Region"):
+         df = built.get(dataset)
+         datasets.append(np.full(len(df), dataset, dtype=object))
+         positions.append(np.arange(len(df)))
+         prices.append(df['price_cents'].to_numpy(dtype=np.int64))
+         data.append(df['allowance_gb'].to_numpy(dtype=float))
+         days.append(df['Validity (Days)'].to_numpy(dtype=np.int64))
+         if dataset == "Country":
+            covered.extend([column[str(name)]] for name in df['Region'].tolist())
+         else:
+            # Coverage repeats per plan, so parse each distinct cell once.
+            parsed = {cell: [by_code[code] for code in coverage_codes(cell) if code in by_code]
+                      for cell in df['Coverage'].unique()}
+            covered.extend(parsed[cell] for cell in df['Coverage'].tolist())
+      self.dataset = np.concatenate(datasets)
+      self.position = np.concatenate(positions)
+      self.price = np.concatenate(prices)
+      self.data = np.concatenate(data)
+      self.days = np.concatenate(days)
+      self.covers = np.zeros((len(self.destinations), len(self.price)), dtype=bool)
+      rows = np.repeat(np.arange(len(covered)), [len(c) for c in covered])
+      self.covers[np.concatenate([c for c in covered if c] or [[]]).astype(np.intp), rows] = True
+
+   # Destination column for a country name or ISO code, or None.
+   def resolve(self, built, name):
+      country = built.resolve_region("Country", name)
+      if country is None:
+         country = self.codes.get(str(name).strip().upper())
+      return self.destinations.index(str(country)) if country is not None else None
+
+
+# Cheapest plan for every subset of legs one plan can cover, in one vectorized pass: subsets
+# are bitmasks over the legs, and a plan fits a subset when it covers all of its destinations,
+# has the subset's total data and stays valid from the first leg's start to the last leg's end
+# (legs are consecutive, so a plan shared by legs 1 and 3 also runs through leg 2).
+def best_plans(index, columns, data, days):
+   legs = len(columns)
+   masks = np.arange(1, 1 << legs)
+   bits = (masks[:, None] >> np.arange(legs)) & 1
+   need_data = np.where(bits, np.asarray(data, dtype=float), 0.0).sum(axis=1)
+   starts = np.concatenate([[0], np.cumsum(days)])
+   first = bits.argmax(axis=1)
+   last = legs - 1 - bits[:, ::-1].argmax(axis=1)
+   span = starts[last + 1] - starts[first]
+
+   # Only plans covering at least one leg are candidates; reduce each to a bitmask of its legs.
+   covers = index.covers[columns]
+   candidates = np.flatnonzero(covers.any(axis=0))
+   plan_masks = (covers[:, candidates].astype(np.int64) << np.arange(legs)[:, None]).sum(axis=0)
+   fits = ((plan_masks[None, :] & masks[:, None]) == masks[:, None]) \
+      & (index.data[candidates][None, :] >= need_data[:, None]) \
+      & (index.days[candidates][None, :] >= span[:, None])
+   cost = np.where(fits, index.price[candidates][None, :], np.iinfo(np.int64).max)
+   best = cost.argmin(axis=1)
+   found = fits[np.arange(len(masks)), best]
+   return {int(mask): (int(cost[i, best[i]]), int(candidates[best[i]]))
+           for i, mask in enumerate(masks) if found[i]}
+
+
+# Up to `alternatives` cheapest ways to partition the quotable legs into plans, as
+# (total cents, [(leg mask, plan row), ...]), by dynamic programming over the leg subsets.
+def cheapest_combinations(best, target, alternatives):
+   if not target:
+      return []
+   by_low = {}
+   for mask in best:
+      by_low.setdefault(mask & -mask, []).append(mask)
+   # combos[mask]: the cheapest ways to cover `mask` as (total, part, rank), meaning plan `part`
+   # plus the rank-th cheapest way to cover the rest; plan lists are only built for the result.
+   combos = {0: [(0, 0, 0)]}
+   for mask in range(1, target + 1):
+      if mask & target != mask:
+         continue
+      options = []
+      for part in by_low.get(mask & -mask, ()):
+         rest = combos.get(mask ^ part) if part & mask == part else None
+         if rest:
+            cost = best[part][0]
+            options.extend((cost + total, part, rank) for rank, (total, _, _) in enumerate(rest))
+      if options:
+         combos[mask] = heapq.nsmallest(alternatives, options)
+
+   results = []
+   for total, part, rank in combos.get(target, []):
+      plans, mask = [], target
+      while part:
+         plans.append((part, best[part][1]))
+         mask ^= part
+         _, part, rank = combos[mask][rank]
+      results.append((total, plans))
+   return results
+
+
+def _leg_fields(leg):
+   if isinstance(leg, dict):
+      return leg.get("destination"), leg.get("data"), leg.get("days")
+   if isinstance(leg, (list, tuple)) and 1 <= len(leg) <= 3:
+      return tuple(leg) + (None,) * (3 - len(leg))
+   raise QuoteError("Each leg must be an object {destination, data, days} or a [destination, data, days] list")
+
+
+# Validated legs as (destination column, country, data GB, days); data and days are minimums
+# and default to 0 (any plan).
+def parse_legs(index, built, legs):
+   if not isinstance(legs, list) or not legs:
+      raise QuoteError("legs must be a non-empty list")
+   if len(legs) > MAX_LEGS:
+      raise QuoteError(f"At most {MAX_LEGS} legs can be quoted at once")
+   parsed, unknown = [], []
+   for i, leg in enumerate(legs):
+      destination, data, days = _leg_fields(leg)
+      column = index.resolve(built, destination) if destination else None
+      if column is None:
+         unknown.append(str(destination))
+         continue
+      try:
+         data = 0.0 if data in (None, "") else data_volume(data)
+         days = 0 if days in (None, "") else day_count(days)
+      except (TypeError, ValueError, OverflowError):
+         raise QuoteError(f"Leg {i}: data must be a number of GB or \"{UNLIMITED}\" and days a whole number")
+      if data < 0 or days < 0:
+         raise QuoteError(f"Leg {i}: data and days cannot be negative")
+      parsed.append((column, index.destinations[column], data, days))
+   if unknown:
+      raise QuoteError(f"Unknown destinations: {', '.join(unknown)}")
+   return parsed
+
+
+# Quotes itineraries against the current catalog, rebuilding the index when the version changes.
+class Quoter:
+   def __init__(self):
+      self._index = None
+      self._lock = threading.Lock()
+
+   def index(self, built):
+      index = self._index
+      if index is None or index.version != built.version:
+         with self._lock:
+            if self._index is None or self._index.version != built.version:
+               self._index = QuoteIndex(built)
+            index = self._index
+      return index
+
+   # (parsed legs, combinations, per-leg total, unmatched leg indices). Combination plans are
+   # (dataset, position, leg indices); the per-leg total prices each leg with its own plan.
+   def quote(self, built, legs, alternatives=DEFAULT_ALTERNATIVES):
+      index = self.index(built)
+      legs = parse_legs(index, built, legs)
+      best = best_plans(index, [leg[0] for leg in legs], [leg[2] for leg in legs], [leg[3] for leg in legs])
+      unmatched = [i for i in range(len(legs)) if (1 << i) not in best]
+      target = sum(1 << i for i in range(len(legs)) if (1 << i) in best)
+      separate = sum(best[1 << i][0] for i in range(len(legs)) if (1 << i) in best)
+      combinations = []
+      for total, plans in cheapest_combinations(best, target, alternatives):
+         combinations.append((total, [
+            (index.dataset[row], int(index.position[row]), [i for i in range(len(legs)) if part >> i & 1])
+            for part, row in plans
+         ]))
+      return legs, combinations, separate, unmatched
+
+
+_quoter = Quoter()
+
+
+def quote(built, legs, alternatives=DEFAULT_ALTERNATIVES):
+   return _quoter.quote(built, legs, alternatives)
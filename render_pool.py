@@ -0,0 +1,205 @@
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from dash import html
+
+DEFAULT_OFFLOAD_ROWS = 500
+RENDER_TIMEOUT = 30
+
+# Columns shown in the table; "ID" is left out.
+DISPLAY_COLUMNS = ['Name', 'Coverage', 'RRP info', 'Per GB', 'Per day', 'Wi-Fi Hotspot', 'Traffic Policy']
+# Price columns shown in the table, mapped to the derived catalog column they are formatted from.
+PRICE_DISPLAY_COLUMNS = {'RRP info': 'price_cents', 'Per GB': 'eur_per_gb', 'Per day': 'eur_per_day'}
+
+
+# Display column -> cell values for the rows at `positions`; prices come converted and
+# formatted from the catalog (`fmt` holds the Catalog.price_labels arguments).
+def table_columns(built, dataset, positions, fmt):
+   df = built.get(dataset)
+   columns = {}
+   for col in DISPLAY_COLUMNS:
+      if col in PRICE_DISPLAY_COLUMNS:
+         columns[col] = built.price_labels(dataset, PRICE_DISPLAY_COLUMNS[col], **fmt)[positions]
+      elif col in df.columns:
+         columns[col] = df[col].iloc[positions].tolist()
+   return columns
+
+
+# `selected` is the index of a row that starts out clicked (a plan chosen through a shared link).
+def build_table(columns, selected=None):
+   return html.Table(
+      style={"width": "100%", "border-collapse": "collapse", "margin": "20px auto"},
+      children=[
+         html.Thead(
+            html.Tr([
+               html.Th(
+                  col,
+                  style={
+                     "padding": "12px",
+                     "border": "1px solid #ddd",
+                     "background-color": "#6A4AE2",
+                     "color": "white",
+                     "cursor": "pointer"  # Add cursor indication
+                  }
+               ) for col in columns
+            ])
+         ),
+         html.Tbody([
+            html.Tr(
+               id={"type": "table-row", "index": i},
+               children=[
+                  html.Td(value, style={"padding": "8px", "border": "1px solid #ddd",
+                                        "transition": "all 0.2s ease"})
+                  for value in values],
+               style={"cursor": "pointer", "background-color": "#f9f9f9"},
+               n_clicks=1 if i == selected else 0
+            ) for i, values in enumerate(zip(*columns.values()))
+         ])
+      ]
+   )
+
+
+# A component tree as the plain dicts Dash sends to the browser. Plain data pickles cheaply
+# and serializes in a fraction of the time Dash needs to walk Component objects.
+def component_data(value):
+   if hasattr(value, "to_plotly_json"):
+      data = value.to_plotly_json()
+      data["props"] = {k: component_data(v) for k, v in data["props"].items()}
+      return data
+   if isinstance(value, (list, tuple)):
+      return [component_data(v) for v in value]
+   return value
+
+
+# Worker process state: the catalog, loaded by warm_up and again whenever a task asks for a
+# version the worker does not have yet (after a hot reload in the server).
+_worker_source = None
+_worker_catalog = None
+
+
+def _load_worker_catalog():
+   base_dir, shared_dir = _worker_source
+   if shared_dir:
+      import shared_catalog
+      return shared_catalog.load_shared_catalog(shared_dir, base_dir, {})
+   import catalog
+   return catalog.load_catalog(base_dir, {})
+
+
+def _init_worker(base_dir, shared_dir):
+   global _worker_source
+   _worker_source = (base_dir, shared_dir)
+
+
+def _worker_catalog_at(version):
+   global _worker_catalog
+   if _worker_catalog is None or _worker_catalog.version != version:
+      _worker_catalog = _load_worker_catalog()
+      if _worker_catalog.version != version:
+         raise RuntimeError(f"worker has catalog {_worker_catalog.version}, expected {version}")
+   return _worker_catalog
+
+
+def _worker_load(version):
+   return _worker_catalog_at(version).version
+
+
+def _worker_render(version, dataset, positions, fmt, selected, submitted):
+   queued = time.time() - submitted
+   start = time.perf_counter()
+   built = _worker_catalog_at(version)
+   table = component_data(build_table(table_columns(built, dataset, positions, fmt), selected))
+   return table, queued, time.perf_counter() - start
+
+
+# Builds large tables in a pool of processes that each hold their own copy of the catalog (or
+# attach to the shared memory-mapped one), so a big render does not hold this process's GIL.
+# Results with fewer than `threshold` rows are cheaper to build inline and stay there, as does
+# everything until warm_up has succeeded.
+class RenderPool:
+   def __init__(self, processes, base_dir, shared_dir=None, threshold=DEFAULT_OFFLOAD_ROWS):
+      self.processes = processes
+      self.threshold = threshold
+      self.ready = False
+      self._executor = ProcessPoolExecutor(
+         processes,
+         mp_context=multiprocessing.get_context("fork"),
+         initializer=_init_worker,
+         initargs=(base_dir, shared_dir),
+      )
+      self._lock = threading.Lock()
+      self.stats = Counter()
+      self._pending = 0
+      self._queue_max = 0.0
+
+   # Fork the workers. Call this before the server starts any threads: a spawned worker would
+   # re-run the server script, and forking a threaded process is unsafe.
+   def start(self):
+      self._executor.submit(int).result()
+
+   # Submit one catalog load per worker process so most of them have `version` before their first
+   # large render. The executor may hand several of these to the same worker; any worker that
+   # missed out loads the catalog on its first render instead. Raises the first worker error and
+   # leaves the pool not ready.
+   def warm_up(self, version):
+      futures = [self._executor.submit(_worker_load, version) for _ in range(self.processes)]
+      wait(futures)
+      for future in futures:
+         if future.exception() is not None:
+            raise future.exception()
+      self.ready = True
+
+   def offloads(self, rows):
+      offload = self.ready and rows >= self.threshold
+      with self._lock:
+         self.stats["offloaded" if offload else "inline"] += 1
+      return offload
+
+   # The rendered table as plain component data, or None if the pool failed (the caller then
+   # renders inline).
+   def render(self, version, dataset, positions, fmt, selected=None):
+      with self._lock:
+         self._pending += 1
+      try:
+         future = self._executor.submit(_worker_render, version, dataset, positions, fmt, selected,
+                                       time.time())
+         table, queued, rendered = future.result(RENDER_TIMEOUT)
+      except Exception as e:
+         with self._lock:
+            self.stats["failed"] += 1
+         print(f"⚠️ Render pool failed, rendering inline: {e!r}")
+         return None
+      finally:
+         with self._lock:
+            self._pending -= 1
+      with self._lock:
+         self.stats["queue_seconds"] += queued
+         self.stats["render_seconds"] += rendered
+         self._queue_max = max(self._queue_max, queued)
+      return table
+
+   def snapshot(self):
+      with self._lock:
+         stats = dict(self.stats)
+         pending = self._pending
+         queue_max = self._queue_max
+      decided = stats.get("offloaded", 0) + stats.get("inline", 0)
+      completed = stats.get("offloaded", 0) - stats.get("failed", 0) - pending
+      return {
+         "processes": self.processes,
+         "threshold_rows": self.threshold,
+         "inline": stats.get("inline", 0),
+         "offloaded": stats.get("offloaded", 0),
+         "failed": stats.get("failed", 0),
+         "pending": pending,
+         "offload_rate": round(stats.get("offloaded", 0) / decided, 4) if decided else 0.0,
+         "queue_ms_avg": round(stats.get("queue_seconds", 0) / completed * 1000, 2) if completed > 0 else 0.0,
+         "queue_ms_max": round(queue_max * 1000, 2),
+         "render_ms_avg": round(stats.get("render_seconds", 0) / completed * 1000, 2) if completed > 0 else 0.0,
+      }
+
+   def shutdown(self):
+      self._executor.shutdown(wait=False, cancel_futures=True)
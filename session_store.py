@@ -0,0 +1,111 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30 * 60
+DEFAULT_MAX_SESSIONS = 10000
+
+
+# In-process store: least recently used sessions are evicted once max_sessions is reached,
+# and entries older than ttl seconds are treated as missing.
+class MemorySessionStore:
+   def __init__(self, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+      self.ttl = ttl
+      self.max_sessions = max_sessions
+      self._entries = OrderedDict()
+      self._lock = threading.Lock()
+
+   def get(self, session_id):
+      with self._lock:
+         entry = self._entries.get(session_id)
+         if entry is None:
+            return None
+         expires, value = entry
+         if expires < time.monotonic():
+            del self._entries[session_id]
+            return None
+         self._entries.move_to_end(session_id)
+         return value
+
+   def set(self, session_id, value):
+      with self._lock:
+         self._entries[session_id] = (time.monotonic() + self.ttl, value)
+         self._entries.move_to_end(session_id)
+         while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+   # Store value only if session_id is absent or expired; returns True when it was stored.
+   def add(self, session_id, value):
+      with self._lock:
+         entry = self._entries.get(session_id)
+         if entry is not None and entry[0] >= time.monotonic():
+            return False
+         self._entries[session_id] = (time.monotonic() + self.ttl, value)
+         self._entries.move_to_end(session_id)
+         while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+         return True
+
+   def delete(self, session_id):
+      with self._lock:
+         self._entries.pop(session_id, None)
+
+
+# SQLite-backed store, so sessions survive restarts and are visible to every worker on the host.
+class SqliteSessionStore:
+   def __init__(self, path, ttl=DEFAULT_TTL):
+      self.ttl = ttl
+      self._lock = threading.Lock()
+      self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+      self._conn.execute("PRAGMA journal_mode=WAL")
+      self._conn.execute(
+         "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+      )
+      self._writes = 0
+
+   def get(self, session_id):
+      with self._lock:
+         row = self._conn.execute(
+            "SELECT value FROM sessions WHERE id = ? AND expires >= ?", (session_id, time.time())
+         ).fetchone()
+      return json.loads(row[0]) if row else None
+
+   def set(self, session_id, value):
+      with self._lock:
+         self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, expires, value) VALUES (?, ?, ?)",
+            (session_id, time.time() + self.ttl, json.dumps(value, default=str)),
+         )
+         # Purge expired rows now and then instead of on every write.
+         self._writes += 1
+         if self._writes % 500 == 0:
+            self._conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+   def add(self, session_id, value):
+      with self._lock:
+         now = time.time()
+         self._conn.execute("DELETE FROM sessions WHERE id = ? AND expires < ?", (session_id, now))
+         cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO sessions (id, expires, value) VALUES (?, ?, ?)",
+            (session_id, now + self.ttl, json.dumps(value, default=str)),
+         )
+         return cursor.rowcount == 1
+
+   def delete(self, session_id):
+      with self._lock:
+         self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+# Build a store from a spec such as "memory", "memory:5000" or "sqlite:/var/lib/travelesim/sessions.db".
+# Returns None when the spec is empty, which keeps session state in the browser.
+def create_session_store(spec, ttl=DEFAULT_TTL):
+   if not spec:
+      return None
+   kind, _, arg = spec.partition(":")
+   if kind == "memory":
+      return MemorySessionStore(ttl=ttl, max_sessions=int(arg) if arg else DEFAULT_MAX_SESSIONS)
+   if kind == "sqlite":
+      return SqliteSessionStore(arg or "sessions.db", ttl=ttl)
+   raise ValueError(f"Unknown session store '{spec}', expected memory[:max] or sqlite:<path>")
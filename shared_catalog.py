@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray, ExtensionDtype, take
+
+import catalog
+
+# Catalog exported as one .npy file per column inside a directory that every worker
+# memory-maps read-only. Numeric columns are stored as-is; text columns with few distinct
+# values as integer category codes plus a small JSON category table, and near-unique plan IDs
+# and names as fixed-width UTF-8 bytes, so the OS page cache holds a single copy of the arrays
+# no matter how many worker processes attach to it.
+#
+# Point TRAVELESIM_SHARED_CATALOG at a tmpfs directory such as /dev/shm/travelesim to keep
+# the segment in shared memory.
+MANIFEST_NAME = "manifest.json"
+SEGMENT_FORMAT = 3
+# Columns that may be stored as MappedStringArray. That array only supports what the app does
+# with these columns (tolist, ==, iloc, take), so every other text column stays categorical and
+# keeps the full pandas string API (.str, value_counts) whatever the data looks like.
+BYTES_COLUMNS = ("ID", "Name")
+
+
+class MappedStringDtype(ExtensionDtype):
+   name = "mapped_string"
+   type = str
+   kind = "O"
+   na_value = np.nan
+
+   @classmethod
+   def construct_array_type(cls):
+      return MappedStringArray
+
+
+# Text column over a fixed-width bytes array (typically the memory-mapped file itself) and an
+# optional missing-value mask. Values are decoded to str only when read, so a worker does not
+# hold a Python string per row of the column.
+class MappedStringArray(ExtensionArray):
+   def __init__(self, data, mask=None):
+      self._data = data
+      self._mask = mask
+
+   @classmethod
+   def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+      values = list(scalars)
+      mask = np.array([value is None or value != value for value in values], dtype=bool)
+      data = np.array([b"" if missing else str(value).encode("utf-8") for value, missing in zip(values, mask)],
+                      dtype=bytes)
+      return cls(data, mask if mask.any() else None)
+
+   @classmethod
+   def _from_factorized(cls, values, original):
+      return cls._from_sequence(values)
+
+   @property
+   def dtype(self):
+      return MappedStringDtype()
+
+   @property
+   def nbytes(self):
+      return self._data.nbytes + (self._mask.nbytes if self._mask is not None else 0)
+
+   def __len__(self):
+      return len(self._data)
+
+   def __getitem__(self, item):
+      if isinstance(item, (int, np.integer)):
+         if self._mask is not None and self._mask[item]:
+            return np.nan
+         return self._data[item].decode("utf-8")
+      item = pd.api.indexers.check_array_indexer(self, item)
+      return type(self)(self._data[item], self._mask[item] if self._mask is not None else None)
+
+   def __array__(self, dtype=None, copy=None):
+      values = np.char.decode(self._data, "utf-8").astype(object)
+      if self._mask is not None:
+         values[self._mask] = np.nan
+      return values if dtype is None else values.astype(dtype)
+
+   def __eq__(self, other):
+      if isinstance(other, str):
+         return (self._data == other.encode("utf-8")) & ~self.isna()
+      return np.asarray(self) == np.asarray(other, dtype=object)
+
+   def isna(self):
+      return self._mask.copy() if self._mask is not None else np.zeros(len(self), dtype=bool)
+
+   def tolist(self):
+      return np.asarray(self).tolist()
+
+   def take(self, indices, allow_fill=False, fill_value=None):
+      if allow_fill and fill_value is not None and fill_value == fill_value:
+         raise ValueError("MappedStringArray can only be filled with missing values")
+      data = take(self._data, indices, allow_fill=allow_fill, fill_value=b"")
+      mask = take(self.isna(), indices, allow_fill=allow_fill, fill_value=True)
+      return type(self)(data, mask if mask.any() else None)
+
+   def copy(self):
+      return type(self)(self._data.copy(), self._mask.copy() if self._mask is not None else None)
+
+   def _values_for_factorize(self):
+      return np.asarray(self), np.nan
+
+   @classmethod
+   def _concat_same_type(cls, to_concat):
+      data = np.concatenate([array._data for array in to_concat])
+      mask = np.concatenate([array.isna() for array in to_concat])
+      return cls(data, mask if mask.any() else None)
+
+
+def segment_name(signature):
+   key = [catalog.SNAPSHOT_FORMAT, SEGMENT_FORMAT, signature]
+   digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+   return f"catalog-{digest[:16]}"
+
+
+def _column_file(dataset, index):
+   return f"{dataset}-{index}.npy"
+
+
+def export_catalog(built, directory):
+   manifest = {"format": SEGMENT_FORMAT, "signature": built.signature, "datasets": {}}
+   for dataset, df in built.frames.items():
+      columns = []
+      for index, col in enumerate(df.columns):
+         values = df[col]
+         entry = {"name": col, "file": _column_file(dataset, index)}
+         if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            array = values.to_numpy()
+         elif col in BYTES_COLUMNS and values.nunique(dropna=False) > len(values) // 2:
+            # Mostly distinct values: a category table would just repeat the column.
+            strings = MappedStringArray._from_sequence(values.tolist())
+            array = strings._data
+            if strings._mask is not None:
+               entry["mask"] = _column_file(dataset, f"{index}-mask")
+               np.save(os.path.join(directory, entry["mask"]), strings._mask)
+            entry["strings"] = True
+         else:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+            array = codes.astype(np.int8 if len(uniques) < 127 else np.int32)
+            entry["categories"] = [v.item() if isinstance(v, np.generic) else v for v in uniques]
+         np.save(os.path.join(directory, entry["file"]), np.ascontiguousarray(array))
+         columns.append(entry)
+      manifest["datasets"][dataset] = {"rows": len(df), "columns": columns}
+   with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+      json.dump(manifest, f)
+
+
+# Map an exported segment read-only; the returned frames are views over the mapped files.
+def attach_catalog(directory):
+   with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+      manifest = json.load(f)
+   if manifest.get("format") != SEGMENT_FORMAT:
+      raise ValueError(f"unsupported catalog segment format in {directory}")
+
+   frames = {}
+   for dataset, spec in manifest["datasets"].items():
+      data = {}
+      for entry in spec["columns"]:
+         array = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+         if "categories" in entry:
+            categories = pd.Index(entry["categories"], dtype=object)
+            data[entry["name"]] = pd.Series(pd.Categorical.from_codes(array, categories=categories), copy=False)
+         elif entry.get("strings"):
+            mask = np.load(os.path.join(directory, entry["mask"]), mmap_mode="r") if "mask" in entry else None
+            data[entry["name"]] = pd.Series(MappedStringArray(array, mask), copy=False)
+         else:
+            data[entry["name"]] = pd.Series(array, copy=False)
+      frames[dataset] = pd.DataFrame(data, copy=False)
+   return catalog.Catalog(frames, manifest["signature"])
+
+
+# Attach to the segment for the current workbooks, building and exporting it first if no
+# worker has done so yet. Builders write to a private temp directory and rename it into
+# place, so concurrent first starts never expose a half-written segment.
+def load_shared_catalog(root, base_dir, timings=None):
+   timings = timings if timings is not None else {}
+   signature = catalog.source_signature(base_dir)
+   directory = os.path.join(root, segment_name(signature))
+
+   if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+      built = catalog.load_catalog(base_dir, timings)
+      start = time.perf_counter()
+      os.makedirs(root, exist_ok=True)
+      tmp_dir = f"{directory}.tmp-{os.getpid()}"
+      os.makedirs(tmp_dir, exist_ok=True)
+      try:
+         export_catalog(built, tmp_dir)
+         os.rename(tmp_dir, directory)
+         print(f"✅ Exported shared catalog segment {directory}")
+         prune_segments(root, signature)
+      except OSError:
+         # Another worker won the race; its segment is identical.
+         if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            raise
+      finally:
+         shutil.rmtree(tmp_dir, ignore_errors=True)
+      timings["shared_export"] = time.perf_counter() - start
+
+   start = time.perf_counter()
+   attached = attach_catalog(directory)
+   timings["shared_attach"] = time.perf_counter() - start
+   return attached
+
+
+# Remove segments left behind by previous versions of the workbooks.
+def prune_segments(root, keep_signature):
+   keep = segment_name(keep_signature)
+   for name in os.listdir(root):
+      if name.startswith("catalog-") and name.split(".tmp-")[0] != keep:
+         shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Token bucket per client key: `rate` tokens per second refill up to `burst`. Only the most
+# recently seen max_keys clients are tracked, so a flood of distinct keys cannot grow memory.
+class TokenBucketLimiter:
+   def __init__(self, rate, burst, max_keys=50000):
+      self.rate = rate
+      self.burst = burst
+      self.max_keys = max_keys
+      self._buckets = OrderedDict()
+      self._lock = threading.Lock()
+
+   def allow(self, key, cost=1.0):
+      now = time.monotonic()
+      with self._lock:
+         tokens, last = self._buckets.get(key, (self.burst, now))
+         tokens = min(self.burst, tokens + (now - last) * self.rate)
+         allowed = tokens >= cost
+         if allowed:
+            tokens -= cost
+         self._buckets[key] = (tokens, now)
+         self._buckets.move_to_end(key)
+         while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+      return allowed
+
+
+class _Call:
+   def __init__(self):
+      self.done = threading.Event()
+      self.result = None
+      self.error = None
+
+
+# Coalesce concurrent calls with the same key: the first caller runs fn, the others wait for
+# it and get the same result (or exception). Nothing is cached once the call completes.
+class SingleFlight:
+   def __init__(self):
+      self._calls = {}
+      self._lock = threading.Lock()
+      self.shared = 0
+
+   def do(self, key, fn):
+      with self._lock:
+         call = self._calls.get(key)
+         leader = call is None
+         if leader:
+            call = self._calls[key] = _Call()
+         else:
+            self.shared += 1
+
+      if not leader:
+         call.done.wait()
+         if call.error is not None:
+            raise call.error
+         return call.result
+
+      try:
+         call.result = fn()
+         return call.result
+      except BaseException as e:
+         call.error = e
+         raise
+      finally:
+         with self._lock:
+            del self._calls[key]
+         call.done.set()
@@ -0,0 +1,142 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Columns a plan cannot be shown or ordered without. Rows missing only optional cells are
+# kept and the gaps are filled with empty strings.
+REQUIRED_COLUMNS = ("Region", "ID", "Name", "RRP info", "Data (GB)", "Validity (Days)")
+OPTIONAL_COLUMNS = ("Wi-Fi Hotspot", "Coverage", "Traffic Policy")
+UNLIMITED = "Unlimited"
+REPORT_NAME = "catalog_rejections.json"
+
+
+# A declarative check: `check` takes the column and returns a boolean Series that is True for
+# valid rows, evaluated over the whole column at once.
+class Rule:
+   def __init__(self, name, column, check, message):
+      self.name = name
+      self.column = column
+      self.check = check
+      self.message = message
+
+
+# Whitespace-stripped cell text, NaN for cells that are not strings.
+def _text(values):
+   if not pd.api.types.is_numeric_dtype(values):
+      try:
+         return values.str.strip()
+      except AttributeError:
+         pass
+   return pd.Series(np.nan, index=values.index, dtype=object)
+
+
+# Strip stray whitespace from every string cell (the workbooks pad names with non-breaking
+# spaces). Runs once before the rules, so they compare clean values.
+def strip_frame(df):
+   df = df.copy()
+   for column in df.columns:
+      text = _text(df[column])
+      if text.notna().any():
+         df[column] = text.where(text.notna(), df[column])
+   return df
+
+
+def _present(values):
+   return values.notna() & values.ne("")
+
+
+# Parse prices such as 7.99, "7.99" or "€7,99" into floats (NaN when unparseable).
+def parse_prices(values):
+   if pd.api.types.is_numeric_dtype(values):
+      return values.astype(float)
+   text = values.astype(str).str.replace(",", ".", regex=False).str.replace(r"[^0-9.\-]", "", regex=True)
+   return pd.to_numeric(text, errors="coerce")
+
+
+def _data_volume_valid(values):
+   volume = pd.to_numeric(values, errors="coerce")
+   unlimited = values.isin([UNLIMITED, UNLIMITED.lower(), UNLIMITED.upper()])
+   return (volume > 0) | unlimited | values.isna()
+
+
+def _days_valid(values):
+   days = pd.to_numeric(values, errors="coerce")
+   return ((days > 0) & (days == days.round())) | values.isna()
+
+
+RULES = [Rule("required", column, _present, "missing required value") for column in REQUIRED_COLUMNS] + [
+   Rule("numeric_price", "RRP info", lambda v: parse_prices(v).notna() | v.isna(), "price is not a number"),
+   Rule("non_negative_price", "RRP info", lambda v: ~(parse_prices(v) < 0), "price is negative"),
+   Rule("data_volume", "Data (GB)", _data_volume_valid, f"data must be a positive number of GB or '{UNLIMITED}'"),
+   Rule("validity_days", "Validity (Days)", _days_valid, "validity must be a positive whole number of days"),
+   Rule("unique_id", "ID", lambda v: ~v.duplicated(keep="first") | v.isna(), "duplicate plan ID"),
+]
+
+
+# Fill optional gaps and coerce the numeric columns of rows that passed validation.
+def normalize_frame(df):
+   df = df.copy()
+   for column in OPTIONAL_COLUMNS:
+      if column in df.columns:
+         df[column] = df[column].fillna("")
+   df['RRP info'] = parse_prices(df['RRP info'])
+   volume = pd.to_numeric(df['Data (GB)'], errors="coerce")
+   df['Data (GB)'] = [
+      (int(n) if n == int(n) else n) if n == n else UNLIMITED
+      for n in volume.tolist()
+   ]
+   df['Validity (Days)'] = pd.to_numeric(df['Validity (Days)']).astype("int64")
+   return df
+
+
+# Run every rule over the frame. Returns the normalized valid rows and one rejection record
+# per failed (row, rule); rows that fail any rule are dropped.
+def validate_frame(df, dataset):
+   missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+   if missing:
+      raise ValueError(f"{dataset} sheet is missing required columns: {', '.join(missing)}")
+   for column in OPTIONAL_COLUMNS:
+      if column not in df.columns:
+         df = df.assign(**{column: ""})
+   df = strip_frame(df)
+
+   valid = np.ones(len(df), dtype=bool)
+   rejections = []
+   for rule in RULES:
+      values = df[rule.column]
+      ok = rule.check(values).to_numpy(dtype=bool)
+      failed = np.flatnonzero(~ok)
+      valid &= ok
+      ids = df['ID'].to_numpy()[failed]
+      for position, plan_id, value in zip(failed.tolist(), ids, values.to_numpy()[failed]):
+         rejections.append({
+            "dataset": dataset,
+            # Spreadsheet row number: header is row 1.
+            "row": position + 2,
+            "id": None if pd.isna(plan_id) else str(plan_id),
+            "rule": rule.name,
+            "column": rule.column,
+            "value": None if pd.isna(value) else str(value),
+            "message": rule.message,
+         })
+   return normalize_frame(df[valid]), rejections
+
+
+def report_path(base_dir):
+   return os.environ.get("TRAVELESIM_REJECTION_REPORT") or os.path.join(base_dir, REPORT_NAME)
+
+
+def write_report(path, signature, counts, rejections):
+   report = {
+      "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+      "signature": signature,
+      "datasets": counts,
+      "rejections": rejections,
+   }
+   tmp_path = f"{path}.{os.getpid()}.tmp"
+   with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump(report, f, indent=1, ensure_ascii=False)
+   os.replace(tmp_path, path)